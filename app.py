@@ -0,0 +1,329 @@
+from config import Config, EncoderProfile
+from quiz_generator import QuizGenerator
+from voice_generator import VoiceGenerator
+from image_generator import ImageGenerator
+from montage import OutputTarget, create_educational_video
+from streaming_media import StreamingMediaScheduler
+from providers import Providers
+from manifest import Manifest
+from media_index import MediaIndex
+from ingest import ingest_directory
+from fanout import master_size
+from encoder_tuner import apply_tuning
+from segment_cache import SegmentCache
+from telemetry import get_telemetry
+from models import QuizSection
+import os
+import json
+from dataclasses import asdict
+import asyncio
+import logging
+from typing import Dict, Optional
+from pathlib import Path
+from concurrent.futures import Executor
+
+class QuizApp:
+    def __init__(self, config: Optional[Config] = None, output_dir: Optional[Path] = None,
+                 providers: Optional[Providers] = None, render_pool: Optional[Executor] = None):
+        self.setup_logging()
+        self.config = config or Config()
+        # Gardés chauds par le service (service.py) entre deux tâches
+        self.providers = providers or Providers(self.config)
+        self.render_pool = render_pool
+        self.base_output_dir = self._setup_output_directory(output_dir)
+        # Entrées de chaque fichier produit par le run, pour reprendre sans refaire ce qui est à jour
+        self.manifest = Manifest(self.base_output_dir)
+        # Durées, dimensions et empreintes des images et des voix, mesurées une fois à leur création
+        self.media_index = MediaIndex(self.base_output_dir)
+        self.quiz_inputs = None
+
+    def setup_logging(self):
+        """Configure la journalisation dans app.log"""
+        log_file = "app.log"
+        logging.basicConfig(
+            filename=log_file,
+            level=logging.DEBUG,
+            format="%(asctime)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+
+    def _setup_output_directory(self, output_dir: Optional[Path] = None) -> Path:
+        """Crée et renvoie le dossier de sortie de base"""
+        output_dir = Path(output_dir) if output_dir else Path(self.config.RUN_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        logging.info(f"Created output directory: {output_dir}")
+        return output_dir
+
+    def _create_subdirectory(self, subdir: str) -> Path:
+        """Crée et renvoie un sous-dossier du dossier de sortie"""
+        path = self.base_output_dir / subdir
+        path.mkdir(exist_ok=True)
+        return path
+
+    def get_user_input(self) -> tuple[str, str]:
+        """Demande et valide la saisie de l'utilisateur"""
+        quiz_type = input("Quel type de quiz voulez-vous générer aujourd'hui ? (Science, Histoire, Geographie ou General) ").strip()
+        num_questions = input("Combien de questions voulez-vous générer ? ").strip()
+        
+        if quiz_type not in ['Science', 'Histoire', 'Geographie', 'General'] or not num_questions.isdigit():
+            raise ValueError("Le type de quiz ne peut pas être différent de Science, Histoire, Geographie ou General et le nombre de questions doit être un nombre.")
+        
+        logging.info(f"User input - Quiz type: {quiz_type}, Number of questions: {num_questions}")
+        return quiz_type, num_questions
+
+    def generate_quiz_content(self, quiz_type: str, num_questions: str, on_field=None):
+        """Génère le contenu du quiz et demande la validation de l'utilisateur
+
+        Avec `on_field`, la complétion arrive en flux et `on_field(path, value)` est
+        appelé pour chaque champ dès qu'il est complet.
+        """
+        quiz_sections = self.generate_quiz(quiz_type, num_questions, on_field)
+        
+        print("\nContenu du quiz généré :")
+        print(quiz_sections)
+        if self.config.DRAFT_PREVIEW:
+            self.render_draft(quiz_type, quiz_sections)
+        
+        with get_telemetry().span("stage.approval"):
+            approved = self._get_user_approval()
+        return quiz_sections if approved else None
+
+    def generate_quiz(self, quiz_type: str, num_questions: str, on_field=None):
+        """Génère et analyse le contenu du quiz sans demander de validation"""
+        quiz_gen = QuizGenerator(self.config, self.providers)
+        self.quiz_inputs = quiz_gen.request_hash(quiz_type, num_questions)
+        with get_telemetry().span("stage.quiz", stream=on_field is not None):
+            return quiz_gen.create_quiz(quiz_type, num_questions, on_field)
+
+    def render_draft(self, quiz_type: str, quiz_sections: QuizSection) -> Optional[Path]:
+        """Rend un aperçu basse résolution, avec des substituts pour les médias pas encore générés"""
+        output_file = self.base_output_dir / "draft_preview.mp4"
+        try:
+            # Les médias d'un quiz précédent du dossier de run restent là jusqu'à ce que la validation les supprime
+            image_gen, voice_gen = self._create_media_generators()
+            draft_media = image_gen.current_files(quiz_sections) + voice_gen.current_files(quiz_sections)
+            with get_telemetry().span("stage.draft"):
+                create_educational_video(
+                    images_dir=str(self.base_output_dir / "images"),
+                    audio_dir=str(self.base_output_dir / "voices"),
+                    output_file=str(output_file),
+                    quiz_type=quiz_type,
+                    draft=True,
+                    texts=VoiceGenerator.voice_parts(quiz_sections),
+                    num_questions=len(quiz_sections.questions),
+                    profile=self.encoder_profile(draft=True),
+                    captions=self.captions(quiz_sections),
+                    media_index=self.media_index,
+                    draft_media=draft_media
+                )
+        except Exception as e:
+            # L'aperçu ne fait qu'aider la relecture, le quiz peut être validé sans lui
+            logging.error(f"Draft preview failed: {str(e)}", exc_info=True)
+            print(f"\nAperçu indisponible : {str(e)}")
+            return None
+
+        print(f"\nAperçu du quiz : {output_file}")
+        logging.info(f"Rendered draft preview: {output_file}")
+        return output_file
+
+    def load_saved_quiz(self, quiz_type: str, num_questions: str) -> Optional[QuizSection]:
+        """Renvoie le quiz déjà validé dans ce dossier de run pour la même demande"""
+        quiz_inputs = QuizGenerator(self.config, self.providers).request_hash(quiz_type, num_questions)
+        if not self.manifest.is_fresh("quiz", "content.json", quiz_inputs):
+            return None
+
+        # Un run terminé n'est pas repris : la même demande donne un nouveau quiz
+        render = self.manifest.get("render", "final_output.mp4")
+        if render is not None and render["created"] >= self.manifest.get("quiz", "content.json")["created"]:
+            return None
+
+        with open(self.manifest.get("quiz", "content.json")["path"], "r", encoding="utf-8") as f:
+            quiz_sections = QuizSection(**json.load(f))
+        self.quiz_inputs = quiz_inputs
+        logging.info("Resuming with the saved quiz content")
+        return quiz_sections
+
+    def _get_user_approval(self) -> bool:
+        """Demande la validation du quiz généré"""
+        while True:
+            response = input("\nEst-ce que le quiz est bien ? (Oui/Non) : ").strip().lower()
+            if response in ['oui', 'non']:
+                return response == 'oui'
+            print("Veuillez répondre par 'Oui' ou 'Non'")
+
+    def save_quiz_content(self, quiz_sections) -> None:
+        """Enregistre le contenu du quiz en JSON"""
+        text_dir = self._create_subdirectory('text')
+        json_file = text_dir / 'content.json'
+        
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump(asdict(quiz_sections), f, ensure_ascii=False, indent=4)
+        if self.quiz_inputs is not None:
+            self.manifest.record("quiz", "content.json", json_file, self.quiz_inputs)
+        logging.info(f"Saved quiz content to: {json_file}")
+
+    def _create_media_generators(self) -> tuple[ImageGenerator, VoiceGenerator]:
+        """Crée les générateurs d'images et de voix qui écrivent dans le dossier de sortie"""
+        image_gen = ImageGenerator(self.config, self._create_subdirectory('images'), self.manifest, self.providers,
+                                   self.media_index)
+        voice_gen = VoiceGenerator(self.config, self._create_subdirectory('voices'), self.manifest, self.providers,
+                                   self.media_index)
+        return image_gen, voice_gen
+
+    def generate_media(self, quiz_sections) -> None:
+        """Génère les images et les voix du quiz, ensemble sur la boucle d'événements des providers"""
+        image_gen, voice_gen = self._create_media_generators()
+        telemetry = get_telemetry()
+
+        async def images():
+            with telemetry.span("stage.images"):
+                await image_gen.generate_images_async(quiz_sections)
+            logging.info("Generated images successfully")
+
+        async def voices():
+            with telemetry.span("stage.voices"):
+                await voice_gen.generate_all_voices_async(quiz_sections)
+            logging.info("Generated voices successfully")
+
+        async def media():
+            await asyncio.gather(images(), voices())
+
+        with telemetry.span("stage.media"):
+            self.providers.run(media())
+        self.ingest_images()
+
+    def ingest_images(self) -> None:
+        """Redimensionne et recadre les images une fois à la résolution de rendu du montage"""
+        size = self.render_size
+        with get_telemetry().span("stage.ingest"):
+            frames = ingest_directory(str(self.base_output_dir / "images"), size)
+        logging.info(f"Ingested {len(frames)} images at {size[0]}x{size[1]}")
+
+    @property
+    def output_size(self) -> tuple[int, int]:
+        return self.config.OUTPUT_WIDTH, self.config.OUTPUT_HEIGHT
+
+    @property
+    def render_size(self) -> tuple[int, int]:
+        """Taille de la timeline : le plus grand des formats de sortie (voir fanout.py)"""
+        return master_size([self.output_size] + list(self.config.EXTRA_OUTPUT_SIZES))
+
+    def encoder_profile(self, draft: bool = False) -> EncoderProfile:
+        """Profil d'encodage du rendu, avec le preset choisi sur cette machine s'il y en a un"""
+        name = self.config.DRAFT_ENCODER_PROFILE if draft else self.config.ENCODER_PROFILE
+        return apply_tuning(self.config.ENCODER_TUNING_FILE, self.config.ENCODER_PROFILES[name])
+
+    def create_media_scheduler(self) -> StreamingMediaScheduler:
+        """Planificateur qui lance la génération des médias pendant que le quiz arrive en flux"""
+        image_gen, voice_gen = self._create_media_generators()
+        return StreamingMediaScheduler(image_gen, voice_gen)
+
+    def captions(self, quiz_sections: Optional[QuizSection]) -> Optional[Dict[str, str]]:
+        """Textes incrustés dans la vidéo par nom de fichier voix, None si CAPTIONS est désactivé"""
+        if not self.config.CAPTIONS or quiz_sections is None:
+            return None
+        return VoiceGenerator.voice_parts(quiz_sections)
+
+    def render_video(self, quiz_type: str, quiz_sections: Optional[QuizSection] = None) -> Path:
+        """Assemble la vidéo finale à partir des images et des voix générées
+
+        Le rendu est sauté si la vidéo existe et qu'aucune image, voix ou sous-titre n'a changé.
+        Les formats d'EXTRA_OUTPUT_SIZES sont rendus dans la même passe à côté d'elle,
+        ex. final_output_1920x1080.mp4.
+        """
+        output_file = self.base_output_dir / "final_output.mp4"
+        profile = self.encoder_profile()
+        captions = self.captions(quiz_sections)
+        targets = [OutputTarget(str(output_file), self.output_size, profile)] + [
+            OutputTarget(str(self.base_output_dir / f"final_output_{width}x{height}.mp4"), (width, height), profile)
+            for width, height in self.config.EXTRA_OUTPUT_SIZES
+        ]
+        render_inputs = Manifest.hash(
+            quiz_type,
+            self.output_size,
+            asdict(profile),
+            self.manifest.input_hashes("images"),
+            self.manifest.input_hashes("voices"),
+            captions,
+            self.config.EXTRA_OUTPUT_SIZES
+        )
+        if all(self.manifest.is_fresh("render", Path(target.output_file).name, render_inputs) for target in targets):
+            logging.info(f"Video is up to date: {output_file}")
+            return output_file
+
+        with get_telemetry().span("stage.render"):
+            create_educational_video(
+                images_dir=str(self.base_output_dir / "images"),
+                audio_dir=str(self.base_output_dir / "voices"),
+                quiz_type=quiz_type,
+                workers=self.config.RENDER_WORKERS,
+                targets=targets,
+                profile=profile,
+                segment_cache=SegmentCache(
+                    os.path.join(self.config.CACHE_DIR, "segments"),
+                    self.config.SEGMENT_CACHE_MAX_MB * 1024 * 1024
+                ),
+                executor=self.render_pool,
+                captions=captions,
+                media_index=self.media_index
+            )
+        for target in targets:
+            self.manifest.record("render", Path(target.output_file).name, target.output_file, render_inputs)
+        return output_file
+
+    def write_run_report(self) -> dict:
+        """Enregistre les intervalles du run dans run_report.json, et en métriques Prometheus si configuré"""
+        telemetry = get_telemetry()
+        report = telemetry.write_report(self.base_output_dir / "run_report.json")
+        if self.config.PROMETHEUS_TEXTFILE:
+            telemetry.write_prometheus(self.config.PROMETHEUS_TEXTFILE)
+        return report
+
+    def run(self):
+        """Boucle principale de l'application"""
+        get_telemetry().reset()
+        try:
+            logging.info("Starting quiz generation process")
+            
+            # Saisie de l'utilisateur et génération du contenu
+            quiz_type, num_questions = self.get_user_input()
+
+            # Un quiz déjà validé pour la même demande est réutilisé tel quel
+            scheduler = None
+            quiz_sections = self.load_saved_quiz(quiz_type, num_questions)
+            if quiz_sections is not None:
+                print("\nReprise du quiz déjà généré, seuls les fichiers manquants ou obsolètes seront refaits.")
+            else:
+                # En mode flux, la génération des médias commence pendant l'écriture du quiz
+                scheduler = self.create_media_scheduler() if self.config.STREAM_QUIZ else None
+                quiz_sections = self.generate_quiz_content(
+                    quiz_type, num_questions, scheduler.on_field if scheduler else None
+                )
+
+            if quiz_sections is None:
+                if scheduler is not None:
+                    scheduler.cancel()
+                logging.info("Quiz generation cancelled by user")
+                print("Génération du quiz annulée !")
+                return
+            
+            # Génération de tout le contenu
+            self.save_quiz_content(quiz_sections)
+            if scheduler is not None:
+                with get_telemetry().span("stage.media"):
+                    scheduler.finish(quiz_sections)
+                self.ingest_images()
+                logging.info("Generated streamed media successfully")
+            else:
+                self.generate_media(quiz_sections)
+            self.render_video(quiz_type, quiz_sections)
+            
+            print("\nGénération du quiz terminée avec succès !")
+            logging.info("Quiz generation completed successfully")
+
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}", exc_info=True)
+            print(f"\nUne erreur est survenue : {str(e)}")
+            print("Consultez le fichier de log pour plus de détails.")
+        finally:
+            self.write_run_report()
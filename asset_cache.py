@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+from moviepy import AudioFileClip, ImageClip
+
+from ingest import load_frame
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+AUDIO_FPS = 44100
+MAX_DURATIONS = 4096
+
+
+class AssetCache:
+    """
+    Cache borné, dans le processus, des images et des sons décodés.
+
+    Les entrées sont indexées par (type, chemin absolu, mtime, taille, inode,
+    paramètres) : un média réécrit sur disque est décodé à nouveau, et les entrées
+    les moins récemment utilisées sont évincées dès que les tableaux décodés
+    dépassent `max_bytes`. Les tableaux en cache sont en lecture seule et partagés
+    par tous les clips construits à partir du même fichier.
+
+    Les médias propres à une seule vidéo (ses images et ses voix) sont chargés avec
+    `keep=False` : ils sont renvoyés sans être stockés et libérés dès que le clip
+    qui les utilise est fermé, la mémoire ne grandit donc pas avec la vidéo.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._durations: "OrderedDict[tuple, float]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _key(self, kind: str, path: str, *params) -> tuple:
+        path = os.path.abspath(path)
+        # Un fichier remplacé par un lien vers un plus ancien peut avoir un mtime plus ancien : l'inode et la taille changent
+        stat = os.stat(path)
+        return (kind, path, stat.st_mtime_ns, stat.st_size, stat.st_ino) + params
+
+    def _get_or_load(self, key: tuple, loader: Callable[[], np.ndarray], keep: bool = True) -> np.ndarray:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = loader()
+        value.flags.writeable = False
+        if not keep:
+            return value
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                self._bytes += value.nbytes
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+            return self._entries[key]
+
+    def image(self, path: str, size: Optional[Tuple[int, int]] = None, keep: bool = True) -> np.ndarray:
+        """
+        Tableau RGB de l'image. Avec `size`, la frame ingérée à cette résolution
+        (redimensionnée et recadrée une fois, voir ingest.py) est projetée en mémoire au lieu d'être décodée.
+        """
+        def load():
+            if size is not None:
+                return load_frame(path, tuple(size))
+            with Image.open(path) as img:
+                return np.array(img.convert("RGB"))
+
+        key_size = tuple(size) if size is not None else None
+        return self._get_or_load(self._key("image", path, key_size), load, keep)
+
+    def audio(self, path: str, fps: int = AUDIO_FPS, keep: bool = True) -> np.ndarray:
+        """Échantillons stéréo décodés du fichier audio à `fps`."""
+        def load():
+            clip = AudioFileClip(path, fps=fps)
+            try:
+                return clip.to_soundarray(fps=fps)
+            finally:
+                clip.close()
+
+        return self._get_or_load(self._key("audio", path, fps), load, keep)
+
+    def audio_duration(self, path: str, fps: int = AUDIO_FPS) -> float:
+        """Durée du son décodé ; seule la durée est gardée, pas les échantillons"""
+        key = self._key("audio", path, fps)
+        with self._lock:
+            if key in self._durations:
+                return self._durations[key]
+
+        duration = len(self.audio(path, fps, keep=False)) / fps
+        with self._lock:
+            self._durations[key] = duration
+            if len(self._durations) > MAX_DURATIONS:
+                self._durations.popitem(last=False)
+        return duration
+
+    def image_clip(self, path: str, size: Optional[Tuple[int, int]] = None, keep: bool = True) -> ImageClip:
+        return ImageClip(self.image(path, size, keep))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._durations.clear()
+            self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+_default_cache: Optional[AssetCache] = None
+
+
+def get_asset_cache() -> AssetCache:
+    """Cache du processus : un par processus de rendu, partagé par toutes les vidéos qu'il rend."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AssetCache()
+    return _default_cache
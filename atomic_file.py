@@ -0,0 +1,29 @@
+"""
+Fichiers remplacés d'un coup : un lecteur (un autre run, un processus de rendu,
+le collecteur textfile de Prometheus) voit l'ancien contenu ou le nouveau,
+jamais une écriture à moitié faite.
+"""
+import json
+import os
+import uuid
+from pathlib import Path
+
+
+def write_text_atomic(path, text: str) -> None:
+    """Écrit `text` dans un fichier temporaire à côté de `path`, puis le renomme à sa place"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Nom temporaire unique : plusieurs threads ou processus peuvent écrire le même fichier
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def write_json_atomic(path, data, **dump_options) -> None:
+    """`data` en JSON (options de json.dumps, ex. indent) écrit avec write_text_atomic"""
+    write_text_atomic(path, json.dumps(data, **dump_options))
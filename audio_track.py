@@ -0,0 +1,93 @@
+from typing import Iterable, Iterator, List, Tuple, Union
+import subprocess
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+SAMPLE_RATE = 44100
+AUDIO_CODEC = "aac"
+AUDIO_BITRATE = "192k"
+
+
+def frame_count(duration: float, fps: int) -> int:
+    """Nombre de frames d'un plan de `duration` secondes, au moins une"""
+    return max(1, int(round(duration * fps)))
+
+
+def frame_to_sample(frame: int, fps: int, sample_rate: int = SAMPLE_RATE) -> int:
+    # Arrondi depuis l'indice absolu de la frame : les limites ne dérivent jamais
+    return int(round(frame * sample_rate / fps))
+
+
+def soundtrack_blocks(parts: Iterable[Tuple[np.ndarray, int]], fps: int,
+                      sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """
+    Dispose le son de plans consécutifs en blocs PCM stéréo consécutifs.
+
+    `parts` donne, dans l'ordre, les échantillons décodés de chaque plan (float, de
+    forme (n, 2), à `sample_rate`) et le nombre de frames vidéo du plan. Chaque
+    partie commence à l'échantillon de sa première frame et est coupée à la
+    première frame du plan suivant, ou complétée de silence jusqu'à elle : la piste
+    dure exactement autant que la vidéo et chaque son commence avec son image.
+
+    Les parties sont consommées une à une : avec un `parts` paresseux, seul le son
+    du plan courant est en mémoire.
+    """
+    frame = 0
+    for samples, frames in parts:
+        start = frame_to_sample(frame, fps, sample_rate)
+        end = frame_to_sample(frame + frames, fps, sample_rate)
+        block = np.zeros((end - start, 2), dtype=np.float32)
+        samples = samples[:end - start]
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        block[:len(samples)] = samples
+        np.clip(block, -1.0, 1.0, out=block)
+        frame += frames
+        yield block
+
+
+def mux_soundtrack(video_file: Union[str, List[str]], track: Union[np.ndarray, Iterable[np.ndarray]],
+                   output_file: Union[str, List[str]], sample_rate: int = SAMPLE_RATE) -> None:
+    """
+    Copie le flux vidéo de `video_file` et encode `track` comme son audio, en un
+    seul appel ffmpeg qui lit les échantillons PCM sur stdin.
+
+    `track` est un tampon entier ou des blocs consécutifs (voir soundtrack_blocks),
+    écrits à mesure qu'ils arrivent : la piste complète n'est jamais en mémoire.
+    Avec des listes de fichiers vidéo et de sortie (un par format de sortie), le
+    même appel multiplexe toutes les sorties : la piste est produite et envoyée une
+    seule fois.
+    """
+    video_files = [video_file] if isinstance(video_file, str) else list(video_file)
+    output_files = [output_file] if isinstance(output_file, str) else list(output_file)
+    audio_input = len(video_files)
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"]
+    for path in video_files:
+        cmd += ["-i", path]
+    cmd += ["-f", "f32le", "-ar", str(sample_rate), "-ac", "2", "-i", "-"]
+    for index, path in enumerate(output_files):
+        cmd += [
+            "-map", f"{index}:v:0", "-map", f"{audio_input}:a:0",
+            "-c:v", "copy", "-c:a", AUDIO_CODEC, "-b:a", AUDIO_BITRATE,
+            "-movflags", "+faststart", path,
+        ]
+    blocks = [track] if isinstance(track, np.ndarray) else track
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for block in blocks:
+            try:
+                proc.stdin.write(np.ascontiguousarray(block, dtype="<f4").tobytes())
+            except BrokenPipeError:
+                # ffmpeg s'est arrêté, son erreur est levée plus bas
+                break
+        proc.stdin.close()
+        # Seules les erreurs sont journalisées, elles tiennent dans le tube pendant l'écriture de stdin
+        stderr = proc.stderr.read()
+        proc.wait()
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    if proc.returncode:
+        raise IOError(stderr.decode("utf8", errors="replace"))
@@ -0,0 +1,267 @@
+"""
+Mode lot non interactif : génère plusieurs vidéos de quiz à partir d'une liste de tâches.
+
+Usage: py batch.py jobs.json [--text-workers 1] [--media-workers 1] [--montage-workers 1]
+
+La liste de tâches est un tableau JSON comme :
+    [
+        {"quiz_type": "Science", "num_questions": 6, "auto_approve": true},
+        {"quiz_type": "Histoire", "num_questions": 8}
+    ]
+
+Les tâches passent dans un pipeline de trois étapes (texte, médias, montage),
+chacune avec son propre pool de workers : le texte de la tâche k+1 est généré
+pendant les médias de la tâche k et le montage de la tâche k-1. Les tâches sans
+auto_approve s'arrêtent après l'étape texte : leur content.json est gardé pour
+relecture et aucun média payant n'est généré.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import argparse
+import json
+import logging
+import time
+
+from config import Config
+from app import QuizApp
+from providers import Providers
+from telemetry import get_telemetry
+
+QUIZ_TYPES = ['Science', 'Histoire', 'Geographie', 'General']
+
+
+@dataclass
+class BatchJob:
+    quiz_type: str
+    num_questions: int
+    auto_approve: bool = False
+    name: str = ""
+
+
+@dataclass
+class JobResult:
+    job: BatchJob
+    output_dir: str
+    status: str = "pending"
+    video: Optional[str] = None
+    error: Optional[str] = None
+    stage_seconds: dict = field(default_factory=dict)
+
+
+@dataclass
+class BatchReport:
+    results: List[JobResult]
+    elapsed: float
+
+    @property
+    def completed(self) -> int:
+        return sum(1 for result in self.results if result.status == "done")
+
+    @property
+    def videos_per_hour(self) -> float:
+        return self.completed / self.elapsed * 3600 if self.elapsed > 0 else 0.0
+
+
+def load_jobs(path: str) -> List[BatchJob]:
+    """Lit et valide une liste de tâches JSON"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    jobs = []
+    for entry in entries:
+        job = BatchJob(
+            quiz_type=entry["quiz_type"],
+            num_questions=int(entry["num_questions"]),
+            auto_approve=bool(entry.get("auto_approve", False)),
+            name=entry.get("name", ""),
+        )
+        if job.quiz_type not in QUIZ_TYPES or job.num_questions < 1:
+            raise ValueError(f"Invalid job {entry}: quiz_type must be one of {QUIZ_TYPES} "
+                             "and num_questions a positive number")
+        jobs.append(job)
+    return jobs
+
+
+class BatchRunner:
+    def __init__(self, config: Config, text_workers: int = 1, media_workers: int = 1, montage_workers: int = 1,
+                 **app_options):
+        self.config = config
+        # Transmis à chaque QuizApp, ex. les providers et le pool de rendu gardés chauds par service.py
+        self.app_options = app_options
+        self.text_pool = ThreadPoolExecutor(max_workers=text_workers, thread_name_prefix="batch-text")
+        self.media_pool = ThreadPoolExecutor(max_workers=media_workers, thread_name_prefix="batch-media")
+        self.montage_pool = ThreadPoolExecutor(max_workers=montage_workers, thread_name_prefix="batch-montage")
+        self.batch_dir = Path(config.OUTPUT_DIR) / datetime.now().strftime("%m-%d-%y") / datetime.now().strftime("batch_%H%M%S")
+
+    def _timed(self, stage: str, result: JobResult, func: Callable[[], None]) -> None:
+        start = time.perf_counter()
+        try:
+            func()
+        finally:
+            result.stage_seconds[stage] = round(time.perf_counter() - start, 3)
+
+    def _new_app(self, result: JobResult) -> QuizApp:
+        return QuizApp(self.config, Path(result.output_dir), **self.app_options)
+
+    def _text_stage(self, result: JobResult):
+        result.status = "text"
+        app = self._new_app(result)
+        holder = {}
+
+        def generate():
+            # Un quiz enregistré dans le dossier du run pour la même demande est repris (voir QuizApp.load_saved_quiz)
+            holder["quiz"] = app.load_saved_quiz(result.job.quiz_type, str(result.job.num_questions))
+            if holder["quiz"] is None:
+                holder["quiz"] = app.generate_quiz(result.job.quiz_type, str(result.job.num_questions))
+            app.save_quiz_content(holder["quiz"])
+
+        self._timed("text", result, generate)
+        if not result.job.auto_approve:
+            if self.config.DRAFT_PREVIEW:
+                self._timed("draft", result, lambda: app.render_draft(result.job.quiz_type, holder["quiz"]))
+            result.status = "awaiting_approval"
+            logging.info(f"Batch job {result.output_dir} saved for approval")
+            return None
+        return app, holder["quiz"]
+
+    def _approved_stage(self, result: JobResult):
+        """Recharge le quiz d'une tâche en attente de validation"""
+        app = self._new_app(result)
+        quiz = app.load_saved_quiz(result.job.quiz_type, str(result.job.num_questions))
+        if quiz is None:
+            raise ValueError(f"No quiz awaiting approval in {result.output_dir}")
+        return app, quiz
+
+    def _media_stage(self, result: JobResult, app: QuizApp, quiz):
+        result.status = "media"
+        self._timed("media", result, lambda: app.generate_media(quiz))
+        return app, quiz
+
+    def _montage_stage(self, result: JobResult, app: QuizApp, quiz):
+        result.status = "montage"
+
+        def render():
+            result.video = str(app.render_video(result.job.quiz_type, quiz))
+
+        self._timed("montage", result, render)
+        result.status = "done"
+        return result
+
+    def _then(self, future: Future, pool: ThreadPoolExecutor, stage: Callable) -> Future:
+        """Soumet `stage(*previous_result)` à `pool` une fois `future` terminé."""
+        chained = Future()
+
+        def forward(done: Future, target: Future = chained):
+            if done.exception() is not None:
+                target.set_exception(done.exception())
+            else:
+                target.set_result(done.result())
+
+        def on_done(done: Future):
+            if done.exception() is not None or done.result() is None:
+                forward(done)
+                return
+            pool.submit(stage, *done.result()).add_done_callback(forward)
+
+        future.add_done_callback(on_done)
+        return chained
+
+    def _media_and_montage(self, result: JobResult, upstream: Future) -> Future:
+        media = self._then(upstream, self.media_pool, lambda app, quiz, r=result: self._media_stage(r, app, quiz))
+        final = self._then(media, self.montage_pool, lambda app, quiz, r=result: self._montage_stage(r, app, quiz))
+        final.add_done_callback(lambda done, r=result: self._on_done(r, done))
+        return final
+
+    def _on_done(self, result: JobResult, final: Future) -> None:
+        if final.exception() is not None:
+            result.status = "failed"
+            result.error = str(final.exception())
+            logging.error(f"Batch job {result.output_dir} failed: {result.error}", exc_info=final.exception())
+
+    def submit(self, job: BatchJob, output_dir) -> Tuple[JobResult, Future]:
+        """Met une tâche en file ; le future se termine après sa dernière étape ou son échec"""
+        result = JobResult(job=job, output_dir=str(output_dir))
+        return result, self._media_and_montage(result, self.text_pool.submit(self._text_stage, result))
+
+    def submit_approved(self, result: JobResult) -> Future:
+        """Génère les médias et la vidéo d'une tâche en attente de validation"""
+        result.job.auto_approve = True
+        result.status = "pending"
+        result.error = None
+        return self._media_and_montage(result, self.text_pool.submit(self._approved_stage, result))
+
+    def shutdown(self) -> None:
+        for pool in (self.text_pool, self.media_pool, self.montage_pool):
+            pool.shutdown(wait=True)
+
+    def run(self, jobs: List[BatchJob]) -> BatchReport:
+        get_telemetry().reset()
+        start = time.perf_counter()
+        results = []
+        finals = []
+        for index, job in enumerate(jobs, start=1):
+            name = job.name or f"{index:02d}_{job.quiz_type.lower()}"
+            result, final = self.submit(job, self.batch_dir / name)
+            results.append(result)
+            finals.append(final)
+
+        for final in finals:
+            # Les échecs sont notés sur la tâche par _on_done
+            wait([final])
+        self.shutdown()
+
+        report = BatchReport(results=results, elapsed=time.perf_counter() - start)
+        self._write_report(report)
+        return report
+
+    def _write_report(self, report: BatchReport) -> None:
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.batch_dir / "batch_report.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "elapsed_seconds": round(report.elapsed, 3),
+                "completed": report.completed,
+                "videos_per_hour": round(report.videos_per_hour, 2),
+                "jobs": [asdict(result) for result in report.results],
+            }, f, ensure_ascii=False, indent=4)
+
+        # Intervalles de toutes les tâches du lot, appels d'API et encodages de segments compris
+        telemetry = get_telemetry()
+        telemetry.write_report(self.batch_dir / "run_report.json")
+        if self.config.PROMETHEUS_TEXTFILE:
+            telemetry.write_prometheus(self.config.PROMETHEUS_TEXTFILE)
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description="Génération de quiz en lot")
+    parser.add_argument("jobs", help="Fichier JSON listant les quiz à générer")
+    parser.add_argument("--text-workers", type=int, default=config.BATCH_TEXT_WORKERS)
+    parser.add_argument("--media-workers", type=int, default=config.BATCH_MEDIA_WORKERS)
+    parser.add_argument("--montage-workers", type=int, default=config.BATCH_MONTAGE_WORKERS)
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs)
+    # Un seul jeu de providers pour tout le lot : les limites de chaque API valent pour toutes les tâches
+    providers = Providers(config)
+    try:
+        runner = BatchRunner(config, args.text_workers, args.media_workers, args.montage_workers,
+                             providers=providers)
+        report = runner.run(jobs)
+    finally:
+        providers.close()
+
+    for result in report.results:
+        line = f"{result.output_dir}: {result.status}"
+        if result.error:
+            line += f" ({result.error})"
+        print(line)
+    print(f"\n{report.completed}/{len(report.results)} vidéos en {report.elapsed:.0f}s, "
+          f"soit {report.videos_per_hour:.1f} vidéos par heure")
+    logging.info(f"Batch finished: {report.completed} videos, {report.videos_per_hour:.1f} videos/hour")
+
+
+if __name__ == "__main__":
+    main()
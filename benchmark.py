@@ -0,0 +1,158 @@
+"""
+Benchmark hors ligne de bout en bout du pipeline de quiz.
+
+Les clients OpenAI et ElevenLabs sont remplacés par les faux clients locaux de
+fakes.py : aucun crédit d'API n'est dépensé. Chaque étape (texte du quiz, images,
+voix, montage) est chronométrée pour chaque nombre de questions, les trois effets
+de mouvement sont mesurés en images par seconde, et les résultats sont écrits en
+JSON pour comparer les commits.
+
+Usage: py benchmark.py [--questions 3 6 10] [--latency 0.5] [--output bench_results.json]
+"""
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmark_effects import compare_effects
+from config import Config
+from fakes import FakeElevenLabs, FakeOpenAI, FakeSession
+from image_generator import ImageGenerator
+from media_index import MediaIndex
+from montage import create_educational_video
+from providers import Providers
+from quiz_generator import QuizGenerator
+from telemetry import get_telemetry
+from voice_generator import VoiceGenerator
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _timed(stages: dict, name: str, func):
+    start = time.perf_counter()
+    result = func()
+    stages[name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def benchmark_pipeline(config: Config, num_questions: int, latency: float, work_dir: Path,
+                       render: bool = True, workers: int = 1) -> dict:
+    """Exécute chaque étape une fois sur les faux clients et renvoie la durée de chacune"""
+    run_dir = work_dir / f"{num_questions}_questions"
+    # Caches neufs : chaque image et chaque voix passe par son (faux) appel d'API. Les faux
+    # clients ne sont pas limités : avec les vraies limites par minute, on mesurerait le limiteur.
+    config = replace(config, OUTPUT_DIR=str(run_dir), CACHE_DIR=str(run_dir / "cache"),
+                     IMAGE_REQUESTS_PER_MINUTE=0, CHAT_REQUESTS_PER_MINUTE=0, VOICE_REQUESTS_PER_MINUTE=0)
+    providers = Providers(config, openai=FakeOpenAI(latency), elevenlabs=FakeElevenLabs(latency),
+                          http=FakeSession(latency / 4))
+    stages = {}
+    telemetry = get_telemetry()
+    telemetry.reset()
+
+    quiz_gen = QuizGenerator(config, providers)
+    quiz = _timed(stages, "text", lambda: quiz_gen.create_quiz("Science", num_questions))
+
+    media_index = MediaIndex(run_dir)
+    image_gen = ImageGenerator(config, str(run_dir / "images"), providers=providers, media_index=media_index)
+    _timed(stages, "images", lambda: image_gen.generate_images(quiz))
+
+    voice_gen = VoiceGenerator(config, str(run_dir / "voices"), providers=providers, media_index=media_index)
+    _timed(stages, "voices", lambda: voice_gen.generate_all_voices(quiz))
+    providers.close()
+
+    if render:
+        _timed(stages, "montage", lambda: create_educational_video(
+            images_dir=str(run_dir / "images"),
+            audio_dir=str(run_dir / "voices"),
+            output_file=str(run_dir / "final_output.mp4"),
+            quiz_type="science",
+            workers=workers,
+            media_index=media_index
+        ))
+
+    report = telemetry.report()
+    return {
+        "questions": num_questions,
+        "stages": stages,
+        "total": round(sum(stages.values()), 3),
+        "render_fps": report["render_fps"],
+        "peak_rss_bytes": report["peak_rss_bytes"],
+        "spans": report["summary"],
+    }
+
+
+def run_benchmark(question_counts, latency: float = 0.5, render: bool = True, workers: int = 1,
+                  effect_seconds: float = 2.0) -> dict:
+    config = Config()
+    work_dir = Path(tempfile.mkdtemp(prefix="quiz_bench_"))
+    try:
+        pipeline = []
+        for num_questions in question_counts:
+            print(f"Pipeline avec {num_questions} questions...")
+            pipeline.append(benchmark_pipeline(config, num_questions, latency, work_dir, render, workers))
+
+        print("Effets de mouvement...")
+        image = np.array(Image.open(os.path.join("static_media", "history.png")).convert("RGB"))
+        effects = compare_effects(image, seconds=effect_seconds)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "commit": _commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {
+            "latency": latency,
+            "render_workers": workers,
+            "image_workers": config.IMAGE_WORKERS,
+            "voice_workers": config.VOICE_WORKERS,
+        },
+        "pipeline": pipeline,
+        "effects": effects,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne du pipeline de quiz")
+    parser.add_argument("--questions", type=int, nargs="+", default=[3, 6, 10])
+    parser.add_argument("--latency", type=float, default=0.5, help="Latence simulée des API (secondes)")
+    parser.add_argument("--workers", type=int, default=1, help="Processus de rendu")
+    parser.add_argument("--effect-seconds", type=float, default=2.0)
+    parser.add_argument("--skip-montage", action="store_true")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.questions, args.latency, not args.skip_montage, args.workers, args.effect_seconds)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+
+    for row in results["pipeline"]:
+        stages = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in row["stages"].items())
+        print(f"{row['questions']} questions : {stages} (total {row['total']:.1f}s)")
+    for row in results["effects"]:
+        print(f"{row['effect']}: {row['legacy_fps']:.1f} -> {row['engine_fps']:.1f} fps")
+    print(f"Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Comparaison en images par seconde entre les anciens effets de mouvement PIL et
+le moteur Ken Burns de ken_burns.py.
+
+Usage: py benchmark_effects.py [image] [--seconds 3] [--fps 24]
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+from PIL import Image
+
+from ken_burns import KenBurnsEffect, ZOOM_IN, ZOOM_OUT, LEFT_TO_RIGHT
+
+
+# Implémentations de référence : les effets image par image qu'utilisait montage.py avant le moteur.
+
+def legacy_zoom_in(get_frame, t, zoom_ratio=0.04):
+    img = Image.fromarray(get_frame(t))
+    base_size = img.size
+    new_size = [
+        math.ceil(img.size[0] * (1 + (zoom_ratio * t))),
+        math.ceil(img.size[1] * (1 + (zoom_ratio * t)))
+    ]
+    new_size[0] = new_size[0] + (new_size[0] % 2)
+    new_size[1] = new_size[1] + (new_size[1] % 2)
+    img = img.resize(new_size, Image.LANCZOS)
+    x = math.ceil((new_size[0] - base_size[0]) / 2)
+    y = math.ceil((new_size[1] - base_size[1]) / 2)
+    img = img.crop([x, y, new_size[0] - x, new_size[1] - y]).resize(base_size, Image.LANCZOS)
+    result = np.array(img)
+    img.close()
+    return result
+
+
+def legacy_zoom_out(get_frame, t, zoom_ratio=0.04):
+    img = Image.fromarray(get_frame(t))
+    base_size = img.size
+    initial_size = [math.ceil(img.size[0] * 0.70), math.ceil(img.size[1] * 0.70)]
+    current_size = [
+        math.ceil(img.size[0] * (1 - (zoom_ratio * t))),
+        math.ceil(img.size[1] * (1 - (zoom_ratio * t)))
+    ]
+    initial_size[0] = initial_size[0] + (initial_size[0] % 2)
+    initial_size[1] = initial_size[1] + (initial_size[1] % 2)
+    current_size[0] = current_size[0] + (current_size[0] % 2)
+    current_size[1] = current_size[1] + (current_size[1] % 2)
+    img = img.resize(current_size, Image.LANCZOS)
+    x = math.ceil((current_size[0] - initial_size[0]) / 2)
+    y = math.ceil((current_size[1] - initial_size[1]) / 2)
+    img = img.crop([x, y, current_size[0] - x, current_size[1] - y]).resize(base_size, Image.LANCZOS)
+    result = np.array(img)
+    img.close()
+    return result
+
+
+def legacy_left_to_right(get_frame, t, travel_ratio=0.02):
+    img = Image.fromarray(get_frame(t))
+    base_size = img.size
+    travel_distance = math.ceil(base_size[0] * travel_ratio * t)
+    left = min(travel_distance, base_size[0])
+    right = min(left + base_size[0], base_size[0])
+    img = img.crop([left, 0, right, base_size[1]])
+    img = img.resize(base_size, Image.LANCZOS)
+    result = np.array(img)
+    img.close()
+    return result
+
+
+EFFECTS = [
+    (ZOOM_IN, 0.04, legacy_zoom_in),
+    (ZOOM_OUT, 0.04, legacy_zoom_out),
+    (LEFT_TO_RIGHT, 0.02, legacy_left_to_right),
+]
+
+
+def measure_fps(effect, get_frame, times):
+    start = time.perf_counter()
+    for t in times:
+        effect(get_frame, t)
+    return len(times) / (time.perf_counter() - start)
+
+
+def compare_effects(image: np.ndarray, seconds: float = 3.0, fps: float = 24):
+    """
+    Chronomètre chaque effet sur `image` et compare le rendu du moteur à l'ancien.
+
+    Renvoie une liste de dicts avec les fps de l'ancien effet et du moteur, le gain
+    et l'écart absolu moyen/maximal par pixel entre les deux rendus.
+    """
+    get_frame = lambda t: image
+    times = [index / fps for index in range(int(seconds * fps))]
+    results = []
+    for kind, ratio, legacy in EFFECTS:
+        legacy_effect = lambda gf, t: legacy(gf, t, ratio)
+        legacy_fps = measure_fps(legacy_effect, get_frame, times)
+        engine_fps = measure_fps(KenBurnsEffect(kind, ratio, duration=seconds, fps=fps), get_frame, times)
+
+        engine = KenBurnsEffect(kind, ratio, duration=seconds, fps=fps)
+        diffs = [
+            np.abs(legacy_effect(get_frame, t).astype(np.int16) - engine(get_frame, t).astype(np.int16))
+            for t in times[::max(1, len(times) // 6)]
+        ]
+        results.append({
+            "effect": kind,
+            "legacy_fps": legacy_fps,
+            "engine_fps": engine_fps,
+            "speedup": engine_fps / legacy_fps,
+            "mean_abs_diff": float(np.mean([d.mean() for d in diffs])),
+            "max_abs_diff": int(max(d.max() for d in diffs)),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des effets de mouvement")
+    parser.add_argument("image", nargs="?", default="static_media/history.png")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--fps", type=float, default=24)
+    args = parser.parse_args()
+
+    image = np.array(Image.open(args.image).convert("RGB"))
+    print(f"Image {args.image} ({image.shape[1]}x{image.shape[0]}), {args.seconds}s a {args.fps} fps")
+    print(f"{'effet':<15}{'legacy fps':>12}{'engine fps':>12}{'speedup':>10}{'diff moy.':>11}")
+    for row in compare_effects(image, args.seconds, args.fps):
+        print(
+            f"{row['effect']:<15}{row['legacy_fps']:>12.1f}{row['engine_fps']:>12.1f}"
+            f"{row['speedup']:>9.1f}x{row['mean_abs_diff']:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
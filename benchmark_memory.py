@@ -0,0 +1,103 @@
+"""
+Pic mémoire du montage selon le nombre de questions.
+
+Les images et les voix de chaque quiz sont produites hors ligne par les faux
+clients de fakes.py, puis chaque quiz est rendu dans un nouveau processus
+Python : le pic de mémoire résidente d'un processus ne fait que croître, chaque
+mesure doit donc partir d'un processus neuf. Avec une timeline en flux, le pic
+doit rester à peu près le même quel que soit le nombre de questions.
+
+Usage: py benchmark_memory.py [--questions 5 10 20 40] [--size 1080x1920] [--workers 1]
+                              [--output bench_memory.json]
+"""
+from pathlib import Path
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import _commit, benchmark_pipeline
+from config import Config
+from telemetry import get_telemetry, peak_rss_bytes
+
+
+def render_once(run_dir: str, size, workers: int) -> dict:
+    """Rend le quiz de `run_dir` dans ce processus et le mesure (lancé dans un processus enfant)"""
+    from media_index import MediaIndex
+    from montage import create_educational_video
+
+    run_dir = Path(run_dir)
+    start = time.perf_counter()
+    create_educational_video(
+        images_dir=str(run_dir / "images"),
+        audio_dir=str(run_dir / "voices"),
+        output_file=str(run_dir / "final_output.mp4"),
+        quiz_type="science",
+        workers=workers,
+        size=size,
+        media_index=MediaIndex(run_dir),
+    )
+    report = get_telemetry().report()
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "frames": report["summary"].get("montage.render", {}).get("frames"),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "peak_children_rss_bytes": peak_rss_bytes(children=True),
+    }
+
+
+def run_memory_benchmark(question_counts, size, workers: int = 1) -> dict:
+    config = Config()
+    work_dir = Path(tempfile.mkdtemp(prefix="quiz_memory_"))
+    rows = []
+    try:
+        for num_questions in question_counts:
+            print(f"Rendu de {num_questions} questions...")
+            benchmark_pipeline(config, num_questions, latency=0.0, work_dir=work_dir, render=False)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--render-one", str(work_dir / f"{num_questions}_questions"),
+                 "--size", f"{size[0]}x{size[1]}", "--workers", str(workers)],
+                stdout=subprocess.PIPE, check=True, text=True
+            )
+            rows.append({"questions": num_questions, **json.loads(proc.stdout.strip().splitlines()[-1])})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "commit": _commit(),
+        "settings": {"size": list(size), "render_workers": workers},
+        "renders": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire du montage selon le nombre de questions")
+    parser.add_argument("--questions", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--size", default="1080x1920", help="Résolution largeurxhauteur")
+    parser.add_argument("--workers", type=int, default=1, help="Processus de rendu")
+    parser.add_argument("--output", default="bench_memory.json")
+    parser.add_argument("--render-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    size = tuple(int(value) for value in args.size.split("x"))
+
+    if args.render_one:
+        # Processus enfant : seul le dernier print est lu par le parent
+        print(json.dumps(render_once(args.render_one, size, args.workers)))
+        return
+
+    results = run_memory_benchmark(args.questions, size, args.workers)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+
+    for row in results["renders"]:
+        print(f"{row['questions']} questions : {row['frames']} frames en {row['seconds']:.1f}s, "
+              f"pic mémoire {row['peak_rss_bytes'] / 1e6:.0f} Mo "
+              f"(ffmpeg et processus de rendu {row['peak_children_rss_bytes'] / 1e6:.0f} Mo)")
+    print(f"Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
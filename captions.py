@@ -0,0 +1,210 @@
+"""
+Sous-titres incrustés dans les frames au moment du rendu.
+
+Le texte est dessiné depuis un GlyphAtlas : chaque caractère est rastérisé une
+fois par taille de police et réutilisé par tous les sous-titres du processus,
+les processus de rendu du service gardent donc leurs glyphes d'une vidéo à
+l'autre. Un sous-titre est composé une fois en CaptionLayer (couleur
+prémultipliée et alpha du seul cadre du sous-titre) ; l'appliquer à une frame
+se résume alors à un mélange alpha entier sur ce cadre, voire à rien par frame
+pour les plans fixes où le mélange est fait une seule fois.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Mise en page, relative à la largeur et à la hauteur de la frame (la police à son petit côté)
+FONT_RATIO = 1 / 18
+MIN_FONT_RATIO = 1 / 30
+WIDTH_RATIO = 0.86
+CENTER_RATIO = 0.72  # au-dessus des boutons et de la description TikTok
+MAX_LINES = 6
+LINE_SPACING = 1.15
+TEXT_COLOR = (255, 255, 255)
+BOX_COLOR = (0, 0, 0)
+BOX_OPACITY = 0.6
+
+
+def load_font(size: int):
+    # La police par défaut de PIL n'a pas d'accents : Arial sous Windows, DejaVu ailleurs
+    for name in ("arial.ttf", "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+@dataclass
+class Glyph:
+    """Couverture d'un caractère, placée à `offset` de la position du stylo en haut de ligne"""
+    mask: np.ndarray
+    offset: Tuple[int, int]
+    advance: float
+
+
+class GlyphAtlas:
+    """Caractères d'une taille de police, rastérisés à la première utilisation"""
+
+    def __init__(self, font_size: int):
+        self.font_size = font_size
+        self.font = load_font(font_size)
+        ascent, descent = self.font.getmetrics()
+        self.line_height = round((ascent + descent) * LINE_SPACING)
+        self.hits = 0
+        self.misses = 0
+        self._glyphs: Dict[str, Glyph] = {}
+
+    def glyph(self, char: str) -> Glyph:
+        glyph = self._glyphs.get(char)
+        if glyph is not None:
+            self.hits += 1
+            return glyph
+
+        self.misses += 1
+        left, top, right, bottom = self.font.getbbox(char)
+        mask = Image.new("L", (max(1, right - left), max(1, bottom - top)))
+        ImageDraw.Draw(mask).text((-left, -top), char, font=self.font, fill=255)
+        glyph = Glyph(np.asarray(mask), (left, top), self.font.getlength(char))
+        self._glyphs[char] = glyph
+        return glyph
+
+    def measure(self, text: str) -> float:
+        return sum(self.glyph(char).advance for char in text)
+
+    def wrap(self, text: str, max_width: float) -> List[str]:
+        """Lignes de mots entiers tenant dans `max_width` pixels (un mot plus long a sa propre ligne)"""
+        lines = []
+        space = self.glyph(" ").advance
+        line, width = [], 0.0
+        for word in text.split():
+            word_width = self.measure(word)
+            if line and width + space + word_width > max_width:
+                lines.append(" ".join(line))
+                line, width = [], 0.0
+            width += (space if line else 0) + word_width
+            line.append(word)
+        if line:
+            lines.append(" ".join(line))
+        return lines
+
+    def draw(self, coverage: np.ndarray, text: str, x: float, y: int) -> None:
+        """Ajoute les glyphes de `text` à `coverage` (uint8), stylo partant de (x, haut de ligne y)"""
+        height, width = coverage.shape
+        for char in text:
+            glyph = self.glyph(char)
+            left = round(x) + glyph.offset[0]
+            top = y + glyph.offset[1]
+            x += glyph.advance
+            # Coupe ce qui sort du cadre
+            gy0, gx0 = max(0, -top), max(0, -left)
+            gy1 = min(glyph.mask.shape[0], height - top)
+            gx1 = min(glyph.mask.shape[1], width - left)
+            if gy1 <= gy0 or gx1 <= gx0:
+                continue
+            region = coverage[top + gy0:top + gy1, left + gx0:left + gx1]
+            np.maximum(region, glyph.mask[gy0:gy1, gx0:gx1], out=region)
+
+
+_atlases: Dict[int, GlyphAtlas] = {}
+
+
+def get_glyph_atlas(font_size: int) -> GlyphAtlas:
+    """Atlas d'une taille de police pour tout le processus : partagé par chaque sous-titre et chaque vidéo rendus"""
+    atlas = _atlases.get(font_size)
+    if atlas is None:
+        atlas = _atlases.setdefault(font_size, GlyphAtlas(font_size))
+    return atlas
+
+
+@dataclass
+class CaptionLayer:
+    """
+    Cadre de sous-titre composé une fois, mélangé à chaque frame.
+
+    `color` est prémultiplié par l'alpha du sous-titre et `inverse` vaut 256 - alpha,
+    tous deux sur une échelle 0-256 en uint16 avec une valeur par canal : le
+    mélange est `(frame * inverse + color) >> 8` sur le seul cadre, sans
+    broadcast ni tableau temporaire.
+    """
+    top: int
+    left: int
+    color: np.ndarray
+    inverse: np.ndarray
+
+    def blend(self, frame: np.ndarray, out: Optional[np.ndarray] = None,
+              work: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Frame avec le sous-titre. La frame source n'est jamais modifiée (ce peut être
+        une image en cache ou le bloc réutilisé d'un effet de mouvement) : le résultat
+        est écrit dans `out` s'il est fourni, sinon dans une copie. `work` est un
+        tampon uint16 de la forme du cadre, réutilisé d'une frame à l'autre.
+        """
+        if out is None:
+            out = frame.copy()
+        else:
+            np.copyto(out, frame)
+        if work is None:
+            work = np.empty_like(self.color)
+        height, width = self.color.shape[:2]
+        region = out[self.top:self.top + height, self.left:self.left + width]
+        np.multiply(region, self.inverse, out=work)
+        np.add(work, self.color, out=work)
+        np.right_shift(work, 8, out=work)
+        np.copyto(region, work, casting="unsafe")
+        return out
+
+
+def _compose(text: str, size: Tuple[int, int]) -> Optional[CaptionLayer]:
+    frame_width, frame_height = size
+    max_width = frame_width * WIDTH_RATIO
+
+    # La police rétrécit jusqu'à ce que le sous-titre tienne en MAX_LINES lignes
+    short_side = min(frame_width, frame_height)
+    font_size = round(short_side * FONT_RATIO)
+    min_font_size = max(8, round(short_side * MIN_FONT_RATIO))
+    while True:
+        atlas = get_glyph_atlas(font_size)
+        padding = font_size // 2
+        lines = atlas.wrap(text, max_width - 2 * padding)
+        if len(lines) <= MAX_LINES or font_size <= min_font_size:
+            break
+        font_size = max(min_font_size, round(font_size * 0.85))
+    lines = lines[:MAX_LINES]
+    if not lines:
+        return None
+
+    widths = [atlas.measure(line) for line in lines]
+    box_width = min(frame_width, round(max(widths)) + 2 * padding)
+    box_height = min(frame_height, len(lines) * atlas.line_height + 2 * padding)
+
+    coverage = np.zeros((box_height, box_width), dtype=np.uint8)
+    for index, (line, line_width) in enumerate(zip(lines, widths)):
+        atlas.draw(coverage, line, (box_width - line_width) / 2, padding + index * atlas.line_height)
+
+    box = Image.new("L", (box_width, box_height))
+    ImageDraw.Draw(box).rounded_rectangle((0, 0, box_width - 1, box_height - 1), radius=padding, fill=255)
+
+    text_alpha = coverage[..., None] / 255.0
+    box_alpha = np.asarray(box)[..., None] / 255.0 * BOX_OPACITY * (1 - text_alpha)
+    alpha = np.round((text_alpha + box_alpha) * 256)
+    color = np.array(TEXT_COLOR) * text_alpha + np.array(BOX_COLOR) * box_alpha
+    # L'arrondi ne doit pas pousser un pixel au-delà de 255 une fois mélangé
+    color = np.minimum(np.round(color * 256), alpha * 255).astype(np.uint16)
+    inverse = np.ascontiguousarray(np.broadcast_to(256 - alpha, color.shape), dtype=np.uint16)
+
+    top = min(max(0, round(frame_height * CENTER_RATIO) - box_height // 2), frame_height - box_height)
+    return CaptionLayer(top, (frame_width - box_width) // 2, color, inverse)
+
+
+@lru_cache(maxsize=16)
+def caption_layer(text: str, size: Tuple[int, int]) -> Optional[CaptionLayer]:
+    """
+    Calque de sous-titre de `text` pour des frames de taille `size` (largeur, hauteur),
+    None pour un texte vide. En cache : les plans d'un segment affichant le même
+    texte partagent un calque.
+    """
+    return _compose(text.strip(), tuple(size))
@@ -1,5 +1,31 @@
-from dataclasses import dataclass
-from typing import List, Dict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+import os
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """Video encoding settings of the montage"""
+    name: str
+    codec: str = "libx264"
+    preset: str = "medium"
+    crf: Optional[int] = 23  # constant quality, ignored when bitrate is set
+    bitrate: Optional[str] = None  # e.g. "4000k"
+    threads: int = 0  # 0: all cores, shared between the render processes
+    fps: int = 24
+
+    def rate_params(self) -> List[str]:
+        if self.bitrate is not None:
+            return ["-b:v", self.bitrate]
+        return ["-crf", str(self.crf)] if self.crf is not None else []
+
+    def thread_params(self) -> List[str]:
+        return ["-threads", str(self.threads)] if self.threads else []
+
+# Vertical video posted on TikTok
+TIKTOK_PROFILE = EncoderProfile("tiktok")
+# Preview rendered before approval: as fast as possible, quality does not matter
+DRAFT_PROFILE = EncoderProfile("draft", preset="ultrafast", crf=30, fps=8)
 
 @dataclass
 class Config:
@@ -8,3 +34,59 @@ class Config:
     ELEVENLABS_VOICE_ID: str = "1ns94GwK9YDCJoL6Nglv"
     ELEVENLABS_MODEL_ID: str = "eleven_multilingual_v2"
     OUTPUT_DIR: str = "./video_data/"
+    # Resolution of the video, every image is resized and cropped to it once
+    OUTPUT_WIDTH: int = 1080
+    OUTPUT_HEIGHT: int = 1920
+    # Other (width, height) formats rendered in the same pass, e.g. [(1920, 1080), (720, 1280)]
+    EXTRA_OUTPUT_SIZES: List[Tuple[int, int]] = field(default_factory=list)
+    RENDER_WORKERS: int = os.cpu_count() or 1
+    IMAGE_WORKERS: int = 4
+    IMAGE_REQUESTS_PER_MINUTE: float = 15
+    VOICE_WORKERS: int = 4
+    VOICE_MAX_RETRIES: int = 5
+    # Token buckets of the other APIs, 0 for no limit besides the number of workers
+    CHAT_REQUESTS_PER_MINUTE: float = 0
+    VOICE_REQUESTS_PER_MINUTE: float = 0
+    # Per-request timeout (seconds) and retries on 429/5xx and timeouts of the OpenAI calls
+    API_TIMEOUT: float = 180.0
+    API_MAX_RETRIES: int = 3
+    # Keep-alive connections of the image downloads and ElevenLabs
+    HTTP_MAX_CONNECTIONS: int = 20
+    CACHE_DIR: str = "./video_data/.cache/"
+    TTS_CACHE_MAX_MB: int = 500
+    IMAGE_CACHE_MAX_MB: int = 2000
+    SEGMENT_CACHE_MAX_MB: int = 2000
+    STREAM_QUIZ: bool = False
+    # Repair requests for the invalid fields of a quiz before giving up (see quiz_schema.py)
+    QUIZ_REPAIR_ATTEMPTS: int = 2
+    # Burn the intro, question and answer texts into the video
+    CAPTIONS: bool = False
+    # Render a low-resolution preview of the quiz before asking for approval
+    DRAFT_PREVIEW: bool = True
+    ENCODER_PROFILES: Dict[str, EncoderProfile] = field(default_factory=lambda: {
+        profile.name: profile for profile in (TIKTOK_PROFILE, DRAFT_PROFILE)
+    })
+    ENCODER_PROFILE: str = "tiktok"
+    DRAFT_ENCODER_PROFILE: str = "draft"
+    # Written by encoder_tuner.py: fastest preset found on this machine for each profile
+    ENCODER_TUNING_FILE: str = "./video_data/.cache/encoder_tuning.json"
+    BATCH_TEXT_WORKERS: int = 1
+    BATCH_MEDIA_WORKERS: int = 1
+    BATCH_MONTAGE_WORKERS: int = 1
+    # Path of a Prometheus textfile (node_exporter) updated after each run, empty to disable
+    PROMETHEUS_TEXTFILE: str = ""
+    # Worker service (service.py) that main.py hands the quiz to when it is running
+    USE_SERVICE: bool = True
+    SERVICE_HOST: str = "127.0.0.1"
+    SERVICE_PORT: int = 8765
+    # Finished jobs the service still reports on GET /jobs, the oldest are forgotten
+    SERVICE_KEPT_JOBS: int = 100
+
+    @property
+    def SERVICE_URL(self) -> str:
+        return f"http://{self.SERVICE_HOST}:{self.SERVICE_PORT}"
+
+    @property
+    def RUN_DIR(self) -> str:
+        """Run directory of the day, the same with or without the service so a rerun resumes"""
+        return os.path.join(self.OUTPUT_DIR, datetime.now().strftime("%m-%d-%y"))
@@ -0,0 +1,225 @@
+"""
+Choisit le preset x264 le plus rapide qui tient encore un objectif de débit et de qualité sur cette machine.
+
+Une courte timeline d'essai (un zoom, un plan fixe et un travelling sur une image
+fixe, les plans d'une vidéo de quiz) est rendue une fois à la résolution de
+sortie dans un fichier brut, puis encodée avec chaque preset du profil. Le temps
+d'encodage, le débit et le PSNR par rapport aux frames rendues sont mesurés, et
+le preset le plus rapide qui tient les objectifs est retenu. Les frames passent
+par des fichiers et des pipes une à une : la mémoire ne dépend pas de la durée
+de l'essai.
+
+Usage: py encoder_tuner.py [--profile tiktok] [--max-bitrate 4000] [--min-psnr 38] [--save]
+
+Avec --save, le résultat est écrit dans ENCODER_TUNING_FILE et QuizApp rend avec
+le preset choisi sur cette machine.
+"""
+from dataclasses import asdict, dataclass, replace
+from typing import List, Optional, Tuple
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from atomic_file import write_json_atomic
+from config import Config, EncoderProfile
+from ingest import OUTPUT_SIZE
+from ken_burns import LEFT_TO_RIGHT, ZOOM_IN
+from montage import ClipSpec, build_clip
+
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow"]
+SAMPLE_IMAGE = os.path.join("static_media", "science.png")
+
+
+@dataclass
+class PresetResult:
+    preset: str
+    encode_seconds: float
+    encode_fps: float
+    bitrate_kbps: float
+    psnr: float
+    meets_target: bool = False
+
+
+def machine_id() -> str:
+    """Un réglage ne vaut que pour la machine sur laquelle il a été mesuré"""
+    return f"{platform.node()}/{platform.machine()}/{os.cpu_count()}"
+
+
+def sample_timeline(size: Tuple[int, int], fps: int, seconds: float = 4.0) -> List[ClipSpec]:
+    shot = max(1, int(seconds * fps / 3))
+    return [
+        ClipSpec(image=SAMPLE_IMAGE, audio="", effect=ZOOM_IN, ratio=0.04, frames=shot),
+        ClipSpec(image=SAMPLE_IMAGE, audio="", frames=shot),
+        ClipSpec(image=SAMPLE_IMAGE, audio="", effect=LEFT_TO_RIGHT, ratio=0.02, frames=shot),
+    ]
+
+
+def render_reference(specs: List[ClipSpec], size: Tuple[int, int], fps: int, path: str) -> int:
+    """
+    Rend la timeline d'essai une fois dans `path`, en rgb24 brut, pour ne mesurer
+    que l'encodeur. Chaque frame est écrite dès qu'elle est rendue, avant la
+    suivante : une frame que l'effet réutilise ensuite est déjà enregistrée.
+    Renvoie le nombre de frames.
+    """
+    count = 0
+    with open(path, "wb") as f:
+        for spec in specs:
+            clip = build_clip(spec, size, fps=fps)
+            try:
+                for index in range(spec.frames):
+                    f.write(clip.get_frame(index / fps).tobytes())
+                    count += 1
+            finally:
+                clip.close()
+    return count
+
+
+def _encode(reference_path: str, size: Tuple[int, int], profile: EncoderProfile, output_file: str) -> float:
+    width, height = size
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{width}x{height}",
+        "-pix_fmt", "rgb24", "-r", "%.02f" % profile.fps, "-an", "-i", reference_path,
+        "-vcodec", profile.codec, "-preset", profile.preset,
+        *profile.rate_params(), *profile.thread_params(),
+        "-pix_fmt", "yuv420p", output_file,
+    ]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode:
+        raise IOError(proc.stderr.decode("utf8", errors="replace"))
+    return time.perf_counter() - start
+
+
+def psnr(reference_path: str, encoded_path: str, size: Tuple[int, int]) -> float:
+    """
+    PSNR de la vidéo encodée par rapport aux frames de référence. La vidéo est
+    décodée frame par frame depuis la sortie de ffmpeg et l'erreur quadratique
+    cumulée au fur et à mesure : ni la référence ni la vidéo décodée ne sont
+    chargées en entier.
+    """
+    width, height = size
+    frame_bytes = width * height * 3
+    reference = np.memmap(reference_path, dtype=np.uint8, mode="r")
+    squared_error = 0.0
+    offset = 0
+    cmd = [FFMPEG_BINARY, "-loglevel", "error", "-i", encoded_path, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+        for chunk in iter(lambda: proc.stdout.read(frame_bytes), b""):
+            decoded = np.frombuffer(chunk, dtype=np.uint8)
+            end = offset + len(decoded)
+            if end <= len(reference):
+                diff = decoded.astype(np.float32) - reference[offset:end]
+                squared_error += float(np.dot(diff, diff))
+            offset = end
+        returncode = proc.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    if offset != len(reference):
+        raise ValueError(f"Decoded video does not match the reference frames: {encoded_path}")
+
+    mse = squared_error / len(reference)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def tune(profile: EncoderProfile, size: Tuple[int, int] = OUTPUT_SIZE, max_bitrate_kbps: Optional[float] = None,
+         min_psnr: Optional[float] = None, seconds: float = 4.0,
+         presets: List[str] = PRESETS) -> Tuple[EncoderProfile, List[PresetResult]]:
+    """
+    Encode la timeline d'essai avec chaque preset et renvoie le profil avec le
+    preset le plus rapide qui tient les objectifs (le profil inchangé si aucun ne
+    les tient), ainsi que les mesures de chaque preset.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="encoder_tuner_") as work_dir:
+        reference = os.path.join(work_dir, "reference.rgb")
+        frame_count = render_reference(sample_timeline(size, profile.fps, seconds), size, profile.fps, reference)
+        duration = frame_count / profile.fps
+        for preset in presets:
+            output_file = os.path.join(work_dir, f"{preset}.mp4")
+            elapsed = _encode(reference, size, replace(profile, preset=preset), output_file)
+            bitrate = os.path.getsize(output_file) * 8 / duration / 1000
+            quality = psnr(reference, output_file, size)
+            results.append(PresetResult(
+                preset=preset,
+                encode_seconds=round(elapsed, 3),
+                encode_fps=round(frame_count / elapsed, 1),
+                bitrate_kbps=round(bitrate, 1),
+                psnr=round(quality, 2),
+                meets_target=((max_bitrate_kbps is None or bitrate <= max_bitrate_kbps)
+                              and (min_psnr is None or quality >= min_psnr)),
+            ))
+
+    candidates = [result for result in results if result.meets_target]
+    if not candidates:
+        return profile, results
+    best = min(candidates, key=lambda result: result.encode_seconds)
+    return replace(profile, preset=best.preset), results
+
+
+def save_tuning(path: str, profile: EncoderProfile, results: List[PresetResult]) -> None:
+    """Enregistre le preset choisi d'un profil pour cette machine, en gardant les autres profils"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tuning = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        tuning = {}
+    tuning[profile.name] = {
+        "machine": machine_id(),
+        "preset": profile.preset,
+        "tuned": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [asdict(result) for result in results],
+    }
+    write_json_atomic(path, tuning, ensure_ascii=False, indent=4)
+
+
+def apply_tuning(path: str, profile: EncoderProfile) -> EncoderProfile:
+    """Le profil avec le preset choisi sur cette machine, s'il y en a un"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f).get(profile.name)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return profile
+    if entry is None or entry.get("machine") != machine_id():
+        return profile
+    return replace(profile, preset=entry["preset"])
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description="Choix du preset x264 le plus rapide pour cette machine")
+    parser.add_argument("--profile", default=config.ENCODER_PROFILE, choices=sorted(config.ENCODER_PROFILES))
+    parser.add_argument("--max-bitrate", type=float, default=None, help="Débit maximal en kbit/s")
+    parser.add_argument("--min-psnr", type=float, default=None, help="Qualité minimale (PSNR en dB)")
+    parser.add_argument("--seconds", type=float, default=4.0, help="Durée de la vidéo d'essai")
+    parser.add_argument("--save", action="store_true", help=f"Enregistre le résultat dans {config.ENCODER_TUNING_FILE}")
+    args = parser.parse_args()
+
+    profile = config.ENCODER_PROFILES[args.profile]
+    size = (config.OUTPUT_WIDTH, config.OUTPUT_HEIGHT)
+    tuned, results = tune(profile, size, args.max_bitrate, args.min_psnr, args.seconds)
+
+    print(f"{'preset':<10} {'temps':>8} {'fps':>7} {'kbit/s':>9} {'PSNR':>7}")
+    for result in results:
+        mark = "  ok" if result.meets_target else ""
+        print(f"{result.preset:<10} {result.encode_seconds:>7.2f}s {result.encode_fps:>7.1f} "
+              f"{result.bitrate_kbps:>9.0f} {result.psnr:>7.2f}{mark}")
+
+    if not any(result.meets_target for result in results):
+        print(f"\nAucun preset n'atteint l'objectif, le profil {profile.name} garde {profile.preset}.")
+        return
+    print(f"\nPreset retenu pour {profile.name} : {tuned.preset}")
+    if args.save:
+        save_tuning(config.ENCODER_TUNING_FILE, tuned, results)
+        print(f"Enregistré dans {config.ENCODER_TUNING_FILE}")
+
+
+if __name__ == "__main__":
+    main()
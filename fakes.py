@@ -0,0 +1,162 @@
+"""
+Remplaçants locaux des API OpenAI et ElevenLabs.
+
+Ils sont donnés à Providers (providers.py) à la place des clients OpenAI,
+ElevenLabs et HTTP pour faire tourner tout le pipeline hors ligne, ex. pour
+benchmark.py. Chaque appel attend `latency` secondes pour imiter l'aller-retour
+réseau.
+"""
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Dict, Iterator, Tuple
+import json
+import re
+import subprocess
+import threading
+import time
+
+from PIL import Image
+
+
+def canned_quiz(num_questions: int) -> dict:
+    """JSON de quiz au format que la consigne demande à GPT-4"""
+    return {
+        "introduction": "Est-ce que tu connais vraiment ce sujet ? On va voir ça tout de suite.",
+        "questions": {f"question_{i}": f"Question numéro {i}, quelle est la bonne réponse ?"
+                      for i in range(1, num_questions + 1)},
+        "reponses": {f"reponse_{i}": f"C'est la réponse {i}, et voici un fait intéressant."
+                     for i in range(1, num_questions + 1)},
+        "appel_abonnement": "Avant la dernière question, abonne-toi et dis moi ton score en commentaire !",
+        "mots_clefs": ["quiz", "benchmark"],
+        "prompts_image_questions": {f"prompt_q{i}": f"A mysterious scene hinting at answer {i}."
+                                    for i in range(1, num_questions + 1)},
+        "prompts_image_reponses": {f"prompt_r{i}": f"A vivid illustration of answer {i}."
+                                   for i in range(1, num_questions + 1)},
+    }
+
+
+class _FakeCompletions:
+    def __init__(self, latency: float, chunk_size: int):
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def create(self, model, messages, stream=False, **kwargs):
+        match = re.search(r"nombre de questions : (\d+)", messages[-1]["content"])
+        text = json.dumps(canned_quiz(int(match.group(1)) if match else 3), ensure_ascii=False, indent=4)
+        if not stream:
+            time.sleep(self.latency)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return self._stream(text)
+
+    def _stream(self, text: str):
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+
+
+class _FakeImages:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def generate(self, model, prompt, size="1024x1792", quality="standard", n=1, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self._count += 1
+            index = self._count
+        return SimpleNamespace(data=[SimpleNamespace(url=f"fake://image/{size}/{index}")])
+
+
+class FakeOpenAI:
+    """Remplace openai.OpenAI : complétions de quiz toutes faites et URL d'images servies par FakeSession"""
+
+    def __init__(self, latency: float = 0.0, chunk_size: int = 40):
+        self.chat = SimpleNamespace(completions=_FakeCompletions(latency, chunk_size))
+        self.images = _FakeImages(latency)
+
+
+def png_bytes(width: int, height: int, seed: int = 0) -> bytes:
+    """PNG en dégradé de la taille demandée"""
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    r, g, b = img.split()
+    img = Image.merge("RGB", (r, g.point(lambda v: (v + seed * 37) % 256), b.transpose(Image.FLIP_TOP_BOTTOM)))
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=65536):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Remplace requests.Session pour les URL fake://image/<size>/<n> de FakeOpenAI"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._images: Dict[Tuple[int, int, int], bytes] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, stream: bool = False, timeout=None):
+        time.sleep(self.latency)
+        _, _, _, size, index = url.split("/")
+        width, height = (int(v) for v in size.split("x"))
+        key = (width, height, int(index) % 8)
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = png_bytes(width, height, key[2])
+        return _FakeResponse(self._images[key])
+
+
+def silent_mp3(duration: float) -> bytes:
+    """MP3 de silence durant `duration` secondes, encodé par ffmpeg"""
+    from moviepy.config import FFMPEG_BINARY
+
+    return subprocess.run(
+        [FFMPEG_BINARY, "-loglevel", "error", "-f", "lavfi", "-i", "anullsrc=r=44100:cl=mono",
+         "-t", f"{duration:.2f}", "-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3", "pipe:1"],
+        check=True, stdout=subprocess.PIPE
+    ).stdout
+
+
+class _FakeTextToSpeech:
+    def __init__(self, latency: float, chars_per_second: float):
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self._audio: Dict[float, bytes] = {}
+        self._lock = threading.Lock()
+
+    def convert(self, voice_id, text, model_id=None, **kwargs) -> Iterator[bytes]:
+        time.sleep(self.latency)
+        # La durée de la voix croît avec le texte, arrondie pour limiter le nombre d'encodages
+        duration = max(1.0, round(len(text) / self.chars_per_second * 2) / 2)
+        with self._lock:
+            if duration not in self._audio:
+                self._audio[duration] = silent_mp3(duration)
+        audio = self._audio[duration]
+        for i in range(0, len(audio), 4096):
+            yield audio[i:i + 4096]
+
+
+class FakeElevenLabs:
+    """Remplace elevenlabs.ElevenLabs : MP3 silencieux aussi longs que la lecture du texte"""
+
+    def __init__(self, latency: float = 0.0, chars_per_second: float = 15.0):
+        self.text_to_speech = _FakeTextToSpeech(latency, chars_per_second)
@@ -0,0 +1,125 @@
+"""
+Diffusion des frames de la timeline vers plusieurs formats de sortie.
+
+Le montage rend chaque frame une seule fois (image, effet de mouvement) à la
+taille maître, celle du plus grand format. Chaque format de sortie reçoit
+ensuite sa propre vue de cette frame : un recadrage centré à son rapport
+d'aspect avec son sous-titre, que son encodeur ffmpeg met à l'échelle du format
+(`scale_params`). Seuls le recadrage et l'incrustation du sous-titre se font en
+Python, sur un thread par format ; la mise à l'échelle et l'encodage tournent
+dans les processus des encodeurs, en parallèle : N formats coûtent un passage
+de timeline et N encodeurs au lieu de N rendus complets.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from captions import caption_layer
+
+Size = Tuple[int, int]
+Box = Tuple[int, int, int, int]
+
+# Mise à l'échelle des encodeurs : le bicubique garde nets les textes des images et des sous-titres
+SCALE_FLAGS = "bicubic"
+
+
+def cover_box(source: Size, target: Size) -> Box:
+    """
+    Recadrage centré (x0, y0, x1, y1) de `source` au rapport d'aspect de `target`.
+    Le côté recadré reste pair, comme l'exigent les encodeurs yuv420p.
+    """
+    source_width, source_height = source
+    target_width, target_height = target
+    if source_width * target_height > target_width * source_height:
+        width = round(source_height * target_width / target_height) // 2 * 2
+        left = (source_width - width) // 2
+        return left, 0, left + width, source_height
+    height = round(source_width * target_height / target_width) // 2 * 2
+    top = (source_height - height) // 2
+    return 0, top, source_width, top + height
+
+
+def master_size(sizes: Sequence[Size]) -> Size:
+    """Taille de rendu de la timeline : le plus grand format, le premier à égalité"""
+    return tuple(max(sizes, key=lambda size: size[0] * size[1]))
+
+
+class TargetView:
+    """
+    Un format de sortie des frames maîtres : le recadrage avec son sous-titre, à la
+    taille du recadrage. Le sous-titre est mis en page pour le recadrage : une fois
+    mis à l'échelle par l'encodeur, il a la même place et les mêmes proportions
+    dans tous les formats.
+    """
+
+    def __init__(self, source_size: Size, size: Size):
+        self.size = tuple(size)
+        self.box = cover_box(tuple(source_size), self.size)
+        self.crop_size = (self.box[2] - self.box[0], self.box[3] - self.box[1])
+        self.cropped = self.crop_size != tuple(source_size)
+        self.layer = None
+        self._out: Optional[np.ndarray] = None
+        self._work: Optional[np.ndarray] = None
+
+    def scale_filter(self) -> Optional[str]:
+        """Filtre ffmpeg qui amène les frames de cette vue à la taille du format, None si elles l'ont déjà"""
+        if self.crop_size == self.size:
+            return None
+        return f"scale={self.size[0]}:{self.size[1]}:flags={SCALE_FLAGS}"
+
+    def scale_params(self) -> List[str]:
+        scale = self.scale_filter()
+        return ["-vf", scale] if scale else []
+
+    def set_caption(self, text: Optional[str]) -> None:
+        self.layer = caption_layer(text, self.crop_size) if text else None
+
+    def frame(self, master: np.ndarray) -> np.ndarray:
+        """Frame de cette vue, valable jusqu'à l'appel suivant (la frame maître n'est pas modifiée)"""
+        frame = master
+        if self.cropped:
+            x0, y0, x1, y1 = self.box
+            frame = master[y0:y1, x0:x1]
+        if self.layer is None:
+            return frame
+
+        if self._out is None or self._out.shape != frame.shape:
+            self._out = np.empty_like(frame)
+        if self._work is None or self._work.shape != self.layer.color.shape:
+            self._work = np.empty_like(self.layer.color)
+        return self.layer.blend(frame, self._out, self._work)
+
+
+class FrameFanOut:
+    """
+    Envoie chaque frame maître à l'encodeur de chaque format.
+
+    `views` sont les formats et `writers` leurs fonctions d'écriture de frame (ex.
+    FFMPEG_VideoWriter.write_frame, ouvert à la taille du recadrage de la vue avec
+    ses scale_params). Avec plus d'un format, chacun est traité sur son propre
+    thread et `write_frame` rend la main quand tous les formats ont leur frame.
+    """
+
+    def __init__(self, views: Sequence[TargetView], writers: Sequence[Callable[[np.ndarray], None]]):
+        self.views = list(views)
+        self.writers = list(writers)
+        self._pool = ThreadPoolExecutor(len(self.views), thread_name_prefix="fanout") if len(self.views) > 1 else None
+
+    def set_caption(self, text: Optional[str]) -> None:
+        for view in self.views:
+            view.set_caption(text)
+
+    def _write(self, index: int, master: np.ndarray) -> None:
+        self.writers[index](self.views[index].frame(master))
+
+    def write_frame(self, master: np.ndarray) -> None:
+        if self._pool is None:
+            self._write(0, master)
+            return
+        for future in [self._pool.submit(self._write, index, master) for index in range(len(self.views))]:
+            future.result()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
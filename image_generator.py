@@ -1,99 +1,153 @@
-from openai import OpenAI
 from typing import Dict, List, Optional
 from models import QuizSection
 from config import Config
-import base64
-import requests
-from pathlib import Path
+from media_cache import MediaCache
+from manifest import Manifest
+from media_index import MediaIndex
+from providers import Providers
+import asyncio
 import os
 
 class ImageGenerator:
-    def __init__(self, config: Config, OUTPUT_IMAGE_DIR: str):
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
+    MODEL = "dall-e-3"
+    SIZE = "1024x1792"  # TikTok format
+    QUALITY = "standard"
+
+    def __init__(self, config: Config, OUTPUT_IMAGE_DIR: str, manifest: Optional[Manifest] = None,
+                 providers: Optional[Providers] = None, media_index: Optional[MediaIndex] = None):
+        # API calls, downloads and their limits, shared by the generators of a run
+        self.providers = providers or Providers(config)
         self.output_dir = OUTPUT_IMAGE_DIR
+        self.manifest = manifest
+        # Dimensions and content hash of each image, measured once for the montage
+        self.media_index = media_index
+
+        # Images already generated for the same final prompt are served from disk
+        self.cache = MediaCache(
+            os.path.join(config.CACHE_DIR, "images"),
+            config.IMAGE_CACHE_MAX_MB * 1024 * 1024,
+            extension=".png"
+        )
+
         os.makedirs(OUTPUT_IMAGE_DIR, exist_ok=True)
 
     def generate_images(self, quiz_section: QuizSection) -> Dict[str, Dict[str, str]]:
         """
         Generate both question and answer images for the quiz using the respective prompts
-        
+
+        Images are generated concurrently, at most `IMAGE_WORKERS` at a time and within
+        the `IMAGE_REQUESTS_PER_MINUTE` limit shared by every generator of the process.
+        Prompts already generated, in this run or a previous one, come from the cache.
+
         Returns:
             Dict with two keys: 'questions' and 'answers', each containing a dictionary
             mapping question numbers to image file paths
         """
+        return self.providers.run(self.generate_images_async(quiz_section))
+
+    async def generate_images_async(self, quiz_section: QuizSection) -> Dict[str, Dict[str, str]]:
+        """`generate_images` on the provider loop, e.g. alongside the voices"""
         image_paths = {
             'questions': {},
             'answers': {}
         }
-        
-        # Generate question images
-        for question_num, prompt in quiz_section.prompts_image_questions.items():
-            try:
-                # Extract question number (e.g., "q1" from "prompt_q1")
-                num = question_num.split('_')[1]
-                
-                # Enhance the prompt for better image generation
-                enhanced_prompt = self._enhance_prompt(prompt)
-                
-                # Generate image using DALL-E
-                response = self.client.images.generate(
-                    model="dall-e-3",
-                    prompt=enhanced_prompt,
-                    size="1024x1792",  # TikTok format
-                    quality="standard",
-                    n=1
-                )
-
-                # Get the image URL
-                image_url = response.data[0].url
-
-                # Download and save the image with "q" prefix
-                image_path = self._download_and_save_image(
-                    image_url, 
-                    f"{num}.png"
-                )
-                
-                image_paths['questions'][question_num] = str(image_path)
-                
-            except Exception as e:
-                print(f"Error generating question image for {question_num}: {str(e)}")
-                continue
 
-        # Generate answer images
-        for answer_num, prompt in quiz_section.prompts_image_reponses.items():
-            try:
-                # Extract answer number (e.g., "r1" from "prompt_r1")
-                num = answer_num.split('_')[1]
-                
-                # Enhance the prompt for better image generation
-                enhanced_prompt = self._enhance_prompt(prompt)
-                
-                # Generate image using DALL-E
-                response = self.client.images.generate(
-                    model="dall-e-3",
-                    prompt=enhanced_prompt,
-                    size="1024x1792",  # TikTok format
-                    quality="standard",
-                    n=1
-                )
-
-                # Get the image URL
-                image_url = response.data[0].url
-
-                # Download and save the image with "a" prefix
-                image_path = self._download_and_save_image(
-                    image_url, 
-                    f"{num}.png"
-                )
-                
-                image_paths['answers'][answer_num] = str(image_path)
-                
-            except Exception as e:
-                print(f"Error generating answer image for {answer_num}: {str(e)}")
+        jobs = (
+            [('questions', 'question', key, prompt) for key, prompt in quiz_section.prompts_image_questions.items()]
+            + [('answers', 'answer', key, prompt) for key, prompt in quiz_section.prompts_image_reponses.items()]
+        )
+        await asyncio.to_thread(self.prune_stale, quiz_section)
+
+        results = await asyncio.gather(
+            *(self.generate_image_async(key, prompt) for _, _, key, prompt in jobs), return_exceptions=True
+        )
+
+        # Collected in submission order so the mapping keeps the prompts order
+        for (section, label, key, _), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                print(f"Error generating {label} image for {key}: {str(result)}")
                 continue
-                
+            image_paths[section][key] = str(result)
+
         return image_paths
 
+    def generate_image(self, prompt_key: str, prompt: str) -> str:
+        """
+        Generate and download the image of one prompt
+
+        Args:
+            prompt_key: Prompt identifier, e.g. "prompt_q1" which is saved as "q1.png"
+            prompt: Image description from the quiz
+
+        Returns:
+            Path of the saved image
+        """
+        return self.providers.run(self.generate_image_async(prompt_key, prompt))
+
+    async def generate_image_async(self, prompt_key: str, prompt: str) -> str:
+        # Extract question or answer number (e.g., "q1" from "prompt_q1")
+        num = prompt_key.split('_')[1]
+
+        # Enhance the prompt for better image generation
+        enhanced_prompt = self._enhance_prompt(prompt)
+
+        filename = f"{num}.png"
+        file_path = os.path.join(self.output_dir, filename)
+        key = self.cache_key(enhanced_prompt)
+
+        # Already produced from the same prompt in this run directory
+        if await self._is_fresh(filename, file_path, key):
+            return file_path
+
+        # File copies, cache locks and index writes run in threads: the event loop keeps
+        # serving the other requests in flight
+        if await asyncio.to_thread(self.cache.link_into, key, file_path):
+            await self._record(filename, file_path, key)
+            return file_path
+
+        # Generate image using DALL-E, then download it
+        image_url = await self.providers.generate_image(enhanced_prompt, self.MODEL, self.SIZE, self.QUALITY)
+        await self.providers.download(image_url, file_path)
+        await asyncio.to_thread(self.cache.add, key, file_path)
+        await self._record(filename, file_path, key)
+        return file_path
+
+    def cache_key(self, enhanced_prompt: str) -> str:
+        return self.cache.key(enhanced_prompt, self.MODEL, self.SIZE, self.QUALITY)
+
+    async def _is_fresh(self, filename: str, file_path: str, key: str) -> bool:
+        if self.manifest is None or not self.manifest.is_fresh("images", filename, key):
+            return False
+        # An image edited since it was produced is made again
+        return self.media_index is None or await asyncio.to_thread(
+            self.media_index.verify, "images", filename, file_path)
+
+    async def _record(self, filename: str, file_path: str, key: str) -> None:
+        if self.media_index is not None:
+            await asyncio.to_thread(self.media_index.record, "images", filename, file_path)
+        if self.manifest is not None:
+            await asyncio.to_thread(self.manifest.record, "images", filename, file_path, key)
+
+    def current_files(self, quiz_section: QuizSection) -> List[str]:
+        """Images of this run directory already produced from the prompts of `quiz_section`"""
+        if self.manifest is None:
+            return []
+        prompts = {**quiz_section.prompts_image_questions, **quiz_section.prompts_image_reponses}
+        filenames = {f"{key.split('_')[1]}.png": self.cache_key(self._enhance_prompt(prompt))
+                     for key, prompt in prompts.items()}
+        return [os.path.join(self.output_dir, filename) for filename, key in filenames.items()
+                if self.manifest.is_fresh("images", filename, key)]
+
+    def prune_stale(self, quiz_section: QuizSection) -> None:
+        """Delete images of a previous quiz in this run directory that the new one does not use"""
+        if self.manifest is None:
+            return
+        keys = list(quiz_section.prompts_image_questions) + list(quiz_section.prompts_image_reponses)
+        filenames = [f"{key.split('_')[1]}.png" for key in keys]
+        self.manifest.prune("images", filenames)
+        if self.media_index is not None:
+            self.media_index.prune("images", filenames)
+
     def _enhance_prompt(self, prompt: str) -> str:
         """
         Enhance the image prompt with additional parameters for better quality
@@ -103,18 +157,5 @@ class ImageGenerator:
             "The style should be vibrant and engaging, with good lighting and composition."
             "Try to use pastel color"
         )
-        
-        return enhancement + prompt
 
-    def _download_and_save_image(self, image_url: str, filename: str) -> str:
-        """
-        Download image from URL and save it to the output directory
-        """
-        response = requests.get(image_url)
-        response.raise_for_status()
-        
-        file_path = os.path.join(self.output_dir, filename)
-        with open(file_path, "wb") as f:
-            f.write(response.content)
-            
-        return file_path
+        return enhancement + prompt
@@ -0,0 +1,100 @@
+from pathlib import Path
+from typing import Iterable, List, Tuple
+import hashlib
+import os
+import uuid
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Résolution portrait TikTok (largeur, hauteur)
+OUTPUT_SIZE = (1080, 1920)
+FRAMES_DIR = ".frames"
+
+
+def source_stamp(image_path: str) -> str:
+    """
+    Identité du fichier image : sa taille, son mtime et son inode. Une image
+    remplacée par un lien physique vers un fichier plus ancien (voir
+    MediaCache.link_into) garde le mtime plus ancien de ce fichier : comparer les
+    dates ne suffit pas, toute différence compte.
+    """
+    stat = os.stat(image_path)
+    stamp = f"{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+    return hashlib.sha1(stamp.encode("ascii")).hexdigest()[:12]
+
+
+def frame_path(image_path: str, size: Tuple[int, int] = OUTPUT_SIZE) -> str:
+    """
+    Emplacement de la frame ingérée du fichier image actuel, ex.
+    images/.frames/q1_1080x1920_<stamp>.npy
+    """
+    image_path = Path(image_path)
+    return str(image_path.parent / FRAMES_DIR /
+               f"{image_path.stem}_{size[0]}x{size[1]}_{source_stamp(str(image_path))}.npy")
+
+
+def _remove_stale_frames(path: str) -> None:
+    """Supprime les frames des versions précédentes de l'image à la même taille"""
+    prefix = os.path.basename(path).rsplit("_", 1)[0] + "_"
+    for other in Path(path).parent.glob(f"{prefix}*.npy"):
+        if str(other) != path and len(other.name) == len(os.path.basename(path)):
+            try:
+                other.unlink()
+            except OSError:
+                # Encore projetée en mémoire par un processus de rendu (Windows) : supprimée la prochaine fois
+                pass
+
+
+def fit_image(img: Image.Image, size: Tuple[int, int] = OUTPUT_SIZE) -> Image.Image:
+    """Met l'image à l'échelle pour couvrir `size` et recadre le dépassement autour du centre"""
+    return ImageOps.fit(img.convert("RGB"), tuple(size), Image.LANCZOS, centering=(0.5, 0.5))
+
+
+def ingest_image(image_path: str, size: Tuple[int, int] = OUTPUT_SIZE) -> str:
+    """
+    Redimensionne et recadre une image une seule fois à la résolution de sortie et
+    la stocke en tableau RGB brut (.npy) à côté d'elle. La frame est reconstruite
+    dès que le fichier image change (voir source_stamp).
+
+    Renvoie le chemin de la frame.
+    """
+    path = frame_path(image_path, size)
+    if os.path.exists(path):
+        return path
+
+    with Image.open(image_path) as img:
+        frame = np.asarray(fit_image(img, size))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Nom temporaire unique : des processus de rendu peuvent ingérer la même image en même temps
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.save(f, frame)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _remove_stale_frames(path)
+    return path
+
+
+def ingest_images(image_paths: Iterable[str], size: Tuple[int, int] = OUTPUT_SIZE) -> List[str]:
+    return [ingest_image(path, size) for path in image_paths]
+
+
+def ingest_directory(images_dir: str, size: Tuple[int, int] = OUTPUT_SIZE) -> List[str]:
+    """Ingère chaque PNG d'un dossier (la sortie d'ImageGenerator)"""
+    return ingest_images(sorted(str(path) for path in Path(images_dir).glob("*.png")), size)
+
+
+def load_frame(image_path: str, size: Tuple[int, int] = OUTPUT_SIZE) -> np.ndarray:
+    """
+    Frame uint8 (hauteur, largeur, 3) en lecture seule de l'image à la taille `size`.
+
+    Le tableau est projeté en mémoire depuis le fichier ingéré : ni décodage PNG ni
+    copie, et les pages sont partagées par tous les processus de rendu qui lisent
+    la même image.
+    """
+    return np.load(ingest_image(image_path, size), mmap_mode="r")
@@ -0,0 +1,102 @@
+import json
+import logging
+from typing import Callable, List, Optional, Tuple
+
+Path = Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Analyseur incrémental qui émet les chaînes JSON dès qu'elles sont complètes.
+
+    Le texte arrive morceau par morceau (ex. d'une complétion en flux). Chaque fois
+    qu'une chaîne se ferme, `on_value(path, value)` est appelé avec le chemin de
+    clés/indices qui y mène, ex. ("questions", "question_1"). Tout ce qui précède le
+    premier "{" (comme un bloc markdown) ou suit l'objet racine est ignoré. Seules
+    les chaînes sont émises ; nombres, booléens et null sont ignorés.
+
+    Une chaîne qui n'est pas du JSON valide (ex. un échappement mal formé) arrête
+    l'émission anticipée au lieu de lever une exception : parse_stream renvoie
+    quand même le texte complet, analysé comme une complétion sans flux, ancien
+    format de repli compris.
+    """
+
+    def __init__(self, on_value: Callable[[Path, str], None]):
+        self.on_value = on_value
+        self.done = False
+        self.failed = False
+        # Chaque niveau est [type, clé_ou_indice, clé_attendue]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+
+    def _path(self) -> Path:
+        return tuple(frame[1] for frame in self._stack)
+
+    def _close_string(self) -> None:
+        raw = "".join(self._string)
+        self._string = []
+        try:
+            value = json.loads('"' + raw + '"', strict=False)
+        except json.JSONDecodeError:
+            if not self.failed:
+                logging.warning("Streamed quiz is not valid JSON, fields are no longer emitted early")
+            self.failed = True
+            value = raw
+        frame = self._stack[-1]
+        if frame[0] == "object" and frame[2]:
+            frame[1] = value
+            frame[2] = False
+        elif not self.failed:
+            self.on_value(self._path(), value)
+
+    def feed(self, chunk: str) -> None:
+        for char in chunk:
+            if self.done:
+                return
+            if self._in_string:
+                if self._escape:
+                    self._string.append(char)
+                    self._escape = False
+                elif char == "\\":
+                    self._string.append(char)
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._close_string()
+                else:
+                    self._string.append(char)
+                continue
+
+            if not self._stack:
+                if char == "{":
+                    self._stack.append(["object", None, True])
+                continue
+
+            frame = self._stack[-1]
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._stack.append(["object", None, True])
+            elif char == "[":
+                self._stack.append(["array", 0, False])
+            elif char in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            elif char == ",":
+                if frame[0] == "object":
+                    frame[2] = True
+                else:
+                    frame[1] += 1
+
+
+def parse_stream(chunks, on_value: Optional[Callable[[Path, str], None]] = None) -> str:
+    """Donne chaque morceau à un analyseur et renvoie le texte complet."""
+    parser = IncrementalJSONParser(on_value or (lambda path, value: None))
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        parser.feed(chunk)
+    return "".join(parts)
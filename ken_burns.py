@@ -0,0 +1,209 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+ZOOM_IN = "zoom_in"
+ZOOM_OUT = "zoom_out"
+LEFT_TO_RIGHT = "left_to_right"
+
+Box = Tuple[float, float, float, float]
+
+# Filtre des anciens effets : un seul rééchantillonnage LANCZOS depuis la source
+# donne les mêmes frames qu'eux, aux arrondis près (voir benchmark_effects.py).
+RESAMPLE = Image.LANCZOS
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Pool partagé qui rééchantillonne un lot de frames en parallèle (PIL libère le GIL)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(thread_name_prefix="ken-burns")
+    return _executor
+
+
+def _even(value: int) -> int:
+    return value + (value % 2)
+
+
+def zoom_in_box(size: Tuple[int, int], t: float, zoom_ratio: float) -> Box:
+    """
+    Zone de recadrage, en pixels source, de l'ancien effet de zoom avant à l'instant t.
+
+    L'ancien effet agrandissait toute l'image de (1 + zoom_ratio * t), recadrait le
+    centre à la taille de base puis redimensionnait encore. Diviser ce recadrage par
+    le facteur d'agrandissement donne la même zone en pixels source : un seul
+    rééchantillonnage suffit.
+    """
+    width, height = size
+    new_w = _even(math.ceil(width * (1 + zoom_ratio * t)))
+    new_h = _even(math.ceil(height * (1 + zoom_ratio * t)))
+    x = math.ceil((new_w - width) / 2)
+    y = math.ceil((new_h - height) / 2)
+    sx = width / new_w
+    sy = height / new_h
+    return (x * sx, y * sy, (new_w - x) * sx, (new_h - y) * sy)
+
+
+def zoom_out_box(size: Tuple[int, int], t: float, zoom_ratio: float) -> Box:
+    """
+    Zone de recadrage, en pixels source, de l'ancien effet de zoom arrière à l'instant t.
+
+    La zone peut dépasser de l'image une fois la taille courante passée sous le
+    recadrage initial à 70 % ; ces parties étaient noires dans l'ancien effet et
+    le restent ici.
+    """
+    width, height = size
+    initial_w = _even(math.ceil(width * 0.70))
+    initial_h = _even(math.ceil(height * 0.70))
+    # L'ancien effet échouait sur une taille nulle ou négative ; on garde au moins deux pixels.
+    current_w = max(2, _even(math.ceil(width * (1 - zoom_ratio * t))))
+    current_h = max(2, _even(math.ceil(height * (1 - zoom_ratio * t))))
+    x = math.ceil((current_w - initial_w) / 2)
+    y = math.ceil((current_h - initial_h) / 2)
+    sx = width / current_w
+    sy = height / current_h
+    return (x * sx, y * sy, (current_w - x) * sx, (current_h - y) * sy)
+
+
+def left_to_right_box(size: Tuple[int, int], t: float, travel_ratio: float) -> Box:
+    """Zone de recadrage, en pixels source, de l'ancien travelling gauche-droite à l'instant t."""
+    width, height = size
+    travel_distance = math.ceil(width * travel_ratio * t)
+    # L'ancien effet donnait un recadrage vide passé le bord droit ; on garde une colonne.
+    left = min(travel_distance, width - 1)
+    return (left, 0, width, height)
+
+
+BOX_FUNCTIONS = {
+    ZOOM_IN: zoom_in_box,
+    ZOOM_OUT: zoom_out_box,
+    LEFT_TO_RIGHT: left_to_right_box,
+}
+
+
+def resample(source: Image.Image, box: Box, size: Tuple[int, int]) -> Image.Image:
+    """
+    Rééchantillonne la zone `box` de `source` à la taille `size` en une seule passe RESAMPLE.
+
+    Les parties de la zone hors de l'image source sont noires, comme avec l'ancien
+    recadrage avec marges.
+    """
+    src_w, src_h = source.size
+    x0, y0, x1, y1 = box
+    if x0 >= 0 and y0 >= 0 and x1 <= src_w and y1 <= src_h:
+        return source.resize(size, RESAMPLE, box=box)
+
+    out_w, out_h = size
+    scale_x = out_w / (x1 - x0)
+    scale_y = out_h / (y1 - y0)
+    cx0, cy0 = max(x0, 0), max(y0, 0)
+    cx1, cy1 = min(x1, src_w), min(y1, src_h)
+    dx0 = round((cx0 - x0) * scale_x)
+    dy0 = round((cy0 - y0) * scale_y)
+    dx1 = round((cx1 - x0) * scale_x)
+    dy1 = round((cy1 - y0) * scale_y)
+
+    canvas = Image.new(source.mode, size)
+    if dx1 > dx0 and dy1 > dy0:
+        part = source.resize((dx1 - dx0, dy1 - dy0), RESAMPLE, box=(cx0, cy0, cx1, cy1))
+        canvas.paste(part, (dx0, dy0))
+    return canvas
+
+
+class KenBurnsEffect:
+    """
+    Fonction de frame d'un effet de mouvement sur une image fixe.
+
+    L'image source est décodée une fois, la zone de recadrage de chaque frame de la
+    grille fps est calculée d'avance, et chaque frame est produite par un seul
+    rééchantillonnage depuis la source. Les frames de la grille fps sont rendues
+    d'avance par lots de `batch_size` sur un pool de threads : un lecteur séquentiel
+    comme l'encodeur ffmpeg trouve la frame suivante déjà prête.
+
+    S'utilise comme `clip.transform(KenBurnsEffect(...))`. Chaque frame renvoyée est
+    un tableau à part, qui reste valable après les appels suivants.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        ratio: float,
+        duration: Optional[float] = None,
+        fps: float = 24,
+        size: Optional[Tuple[int, int]] = None,
+        batch_size: int = 8,
+    ):
+        if kind not in BOX_FUNCTIONS:
+            raise ValueError(f"Unknown motion effect: {kind}")
+        self.kind = kind
+        self.ratio = ratio
+        self.duration = duration
+        self.fps = fps
+        self.size = size
+        self.batch_size = max(1, batch_size)
+
+        self._source: Optional[Image.Image] = None
+        self._boxes = []
+        self._batch: List[np.ndarray] = []
+        self._batch_start = -1
+
+    def load(self, frame: np.ndarray) -> None:
+        """Décode l'image source et précalcule la zone de recadrage de chaque frame."""
+        self._source = Image.fromarray(frame)
+        if self.size is None:
+            self.size = self._source.size
+        box_function = BOX_FUNCTIONS[self.kind]
+        if self.duration is not None:
+            num_frames = int(math.ceil(self.duration * self.fps)) + 1
+            self._boxes = [
+                box_function(self._source.size, index / self.fps, self.ratio)
+                for index in range(num_frames)
+            ]
+
+    def box_at(self, t: float) -> Box:
+        return BOX_FUNCTIONS[self.kind](self._source.size, t, self.ratio)
+
+    def _frame_index(self, t: float) -> Optional[int]:
+        index = round(t * self.fps)
+        if 0 <= index < len(self._boxes) and abs(index - t * self.fps) < 1e-6:
+            return index
+        return None
+
+    def _render(self, box: Box) -> np.ndarray:
+        return np.asarray(resample(self._source, box, self.size))
+
+    def render_batch(self, start: int) -> None:
+        """Rend les frames [start, start + batch_size) de la grille fps."""
+        boxes = self._boxes[start:start + self.batch_size]
+        if len(boxes) > 1:
+            self._batch = list(_get_executor().map(self._render, boxes))
+        else:
+            self._batch = [self._render(boxes[0])]
+        self._batch_start = start
+
+    def frame(self, t: float) -> np.ndarray:
+        """Frame à l'instant t, tirée du lot rendu d'avance quand t est sur la grille fps."""
+        index = self._frame_index(t)
+        if index is None:
+            # Instant hors grille (aperçu, lecture à un autre fps) : rendu à la demande.
+            return self._render(self.box_at(t))
+        offset = index - self._batch_start
+        if not 0 <= offset < len(self._batch):
+            self.render_batch(index)
+            offset = 0
+        return self._batch[offset]
+
+    def __call__(self, get_frame, t: float) -> np.ndarray:
+        if self._source is None:
+            self.load(get_frame(0))
+        return self.frame(t)
+
+
+def apply_effect(clip, kind: str, ratio: float, fps: float = 24, size: Optional[Tuple[int, int]] = None):
+    """Renvoie `clip` avec l'effet de mouvement demandé."""
+    return clip.transform(KenBurnsEffect(kind, ratio, duration=clip.duration, fps=fps, size=size))
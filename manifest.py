@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from atomic_file import write_json_atomic
+
+
+class Manifest:
+    """
+    Registre des fichiers produits dans un dossier de run et des entrées qui les ont produits.
+
+    Les entrées sont groupées par étape ("quiz", "images", "voices", "render") et
+    indexées par nom de fichier, ex. manifest.record("images", "q3.png", path, inputs_hash).
+    À la relance, un fichier toujours présent dont l'empreinte des entrées est
+    inchangée est à jour et peut être sauté ; tout ce qui manque ou est périmé est
+    régénéré.
+    """
+
+    FILE = "manifest.json"
+
+    def __init__(self, run_dir):
+        self.run_dir = Path(run_dir)
+        self.path = self.run_dir / self.FILE
+        self._lock = threading.Lock()
+        self._stages = self._load()
+
+    @staticmethod
+    def hash(*parts) -> str:
+        """Empreinte des entrées d'un fichier produit"""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self) -> Dict[str, Dict[str, dict]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self) -> None:
+        write_json_atomic(self.path, self._stages, ensure_ascii=False, indent=4)
+
+    def get(self, stage: str, name: str) -> Optional[dict]:
+        with self._lock:
+            return self._stages.get(stage, {}).get(name)
+
+    def is_fresh(self, stage: str, name: str, inputs_hash: str) -> bool:
+        """True si le fichier existe et a été produit à partir des mêmes entrées"""
+        entry = self.get(stage, name)
+        return (
+            entry is not None
+            and entry["inputs"] == inputs_hash
+            and os.path.exists(entry["path"])
+        )
+
+    def record(self, stage: str, name: str, path, inputs_hash: str) -> None:
+        with self._lock:
+            self._stages.setdefault(stage, {})[name] = {
+                "path": str(path),
+                "inputs": inputs_hash,
+                "created": time.time(),
+            }
+            self._save()
+
+    def input_hashes(self, stage: str) -> Dict[str, str]:
+        """Empreinte des entrées de chaque fichier d'une étape, pour en déduire les entrées de la suivante"""
+        with self._lock:
+            return {name: entry["inputs"] for name, entry in sorted(self._stages.get(stage, {}).items())}
+
+    def prune(self, stage: str, keep: Iterable[str]) -> None:
+        """Oublie et supprime les fichiers d'une étape absents de `keep`"""
+        keep = set(keep)
+        with self._lock:
+            entries = self._stages.get(stage, {})
+            for name in [name for name in entries if name not in keep]:
+                path = entries.pop(name)["path"]
+                if os.path.exists(path):
+                    os.remove(path)
+            self._save()
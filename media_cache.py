@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from atomic_file import write_json_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class MediaCache:
+    """
+    Stockage persistant, adressé par contenu, des médias générés.
+
+    Les fichiers sont rangés sous `root/<key[:2]>/<key><extension>`, la clé étant
+    un SHA-256 des entrées qui les ont produits : le stockage est partagé par tous
+    les dossiers de sortie datés. Un fichier d'index garde la taille et le dernier
+    accès de chaque entrée ; dès que le total dépasse `max_bytes`, les entrées les
+    moins récemment utilisées sont évincées. `hits` et `misses` comptent les
+    recherches depuis l'ouverture du cache.
+
+    Plusieurs runs peuvent partager le stockage : chaque mise à jour de l'index se
+    fait sous un fichier verrou exclusif après relecture de l'index, et les médias
+    sont écrits sous un nom temporaire privé puis renommés à leur place.
+    """
+
+    INDEX_FILE = "index.json"
+    LOCK_FILE = ".lock"
+
+    def __init__(self, root: str, max_bytes: int, extension: str = ""):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._index_path = os.path.join(root, self.INDEX_FILE)
+        self._lock_path = os.path.join(root, self.LOCK_FILE)
+        self._index = self._load_index()
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Empreinte des entrées qui identifient un média."""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + self.extension)
+
+    def _load_index(self) -> Dict[str, dict]:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self) -> None:
+        write_json_atomic(self._index_path, self._index)
+
+    @contextmanager
+    def _locked(self):
+        """Tient le verrou des threads et le verrou entre processus, avec un index relu."""
+        with self._lock, open(self._lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                self._index = self._load_index()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Recherche dans l'index ; l'appelant tient le verrou."""
+        path = self.path(key)
+        if key in self._index and os.path.exists(path):
+            self._index[key]["last_access"] = time.time()
+            self._save_index()
+            self.hits += 1
+            return path
+        if self._index.pop(key, None) is not None:
+            self._save_index()
+        self.misses += 1
+        return None
+
+    def link_into(self, key: str, destination: str) -> bool:
+        """Lie physiquement (ou copie) un fichier en cache vers `destination` ; False s'il est absent."""
+        # Le lien est fait sous le verrou pour qu'un autre run ne puisse pas évincer le fichier entre-temps
+        with self._locked():
+            path = self._lookup(key)
+            if path is None:
+                return False
+            link_or_copy(path, destination)
+            return True
+
+    def add(self, key: str, source: str) -> str:
+        """Stocke une copie de `source` sous `key` et évince les anciennes entrées si besoin."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._locked():
+            self._index[key] = {"size": os.path.getsize(path), "last_access": time.time()}
+            self._evict()
+            self._save_index()
+        return path
+
+    def _evict(self) -> None:
+        total = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(key)["size"]
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(entry["size"] for entry in self._index.values())
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    """Lie physiquement `source` à `destination`, en copiant quand le lien est impossible."""
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
@@ -0,0 +1,194 @@
+"""
+Métadonnées des images et des voix d'un dossier de run, mesurées une seule fois.
+
+Les générateurs enregistrent chaque média dès qu'ils le produisent : son
+empreinte, sa taille et, pour une image, ses dimensions, pour une voix sa
+durée, sa fréquence d'échantillonnage, ses canaux et son niveau sonore. Le
+montage, son planificateur et la reprise les lisent ensuite dans
+media_index.json au lieu d'ouvrir les médias : plus de sonde ffmpeg ni de
+décodage juste pour connaître la durée d'une voix ou le nombre de questions.
+
+Une entrée n'est valable que tant que son fichier est inchangé : même taille et
+même mtime, ou même empreinte après une copie qui a changé le mtime. Tout le
+reste est mesuré à nouveau, un index périmé ne peut donc jamais changer un rendu.
+"""
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from PIL import Image
+from moviepy import AudioFileClip
+
+from asset_cache import AUDIO_FPS
+from atomic_file import write_json_atomic
+from segment_cache import file_digest
+
+# Champs propres au fichier, les autres décrivent le média et ne dépendent que de son contenu
+FILE_FIELDS = ("path", "sha256", "bytes", "mtime_ns")
+
+
+def image_info(path: str) -> dict:
+    """Dimensions d'une image, lues dans son en-tête"""
+    with Image.open(path) as img:
+        return {"width": img.width, "height": img.height, "mode": img.mode}
+
+
+def _db(value: float) -> Optional[float]:
+    # None pour un silence numérique, qui n'a pas de niveau en dBFS
+    return round(20 * math.log10(value), 2) if value > 0 else None
+
+
+def audio_info(path: str, fps: int = AUDIO_FPS) -> dict:
+    """
+    Durée, fréquence d'échantillonnage, canaux et niveau sonore d'un fichier audio, en un décodage.
+
+    La durée est celle des échantillons décodés à `fps`, exactement celle que
+    donne AssetCache.audio_duration : le nombre de frames du montage ne dépend
+    pas de la provenance de la durée. Le niveau est le RMS et la crête des
+    échantillons décodés, en dBFS.
+    """
+    clip = AudioFileClip(path, fps=fps)
+    try:
+        samples = clip.to_soundarray(fps=fps)
+        sample_rate = clip.reader.infos.get("audio_fps", fps)
+        channels = clip.reader.nchannels
+    finally:
+        clip.close()
+
+    samples = np.asarray(samples, dtype=np.float32)
+    return {
+        "duration": len(samples) / fps,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "loudness_db": _db(float(np.sqrt(np.mean(np.square(samples))))) if samples.size else None,
+        "peak_db": _db(float(np.max(np.abs(samples)))) if samples.size else None,
+    }
+
+
+MEASURES = {
+    "images": image_info,
+    "voices": audio_info,
+}
+
+
+class MediaIndex:
+    """
+    Métadonnées des médias d'un run, groupées par étape ("images", "voices") et
+    indexées par nom de fichier comme le Manifest,
+    ex. index.record("voices", "Question_3.mp3", path).
+    """
+
+    FILE = "media_index.json"
+
+    def __init__(self, run_dir):
+        self.run_dir = Path(run_dir)
+        self.path = self.run_dir / self.FILE
+        self._lock = threading.Lock()
+        self._stages = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, dict]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self) -> None:
+        write_json_atomic(self.path, self._stages, ensure_ascii=False, indent=4)
+
+    def _measured(self, stage: str, digest: str) -> Optional[dict]:
+        """Champs média d'un fichier de même contenu, ex. une voix partagée par deux fichiers"""
+        for entry in self._stages.get(stage, {}).values():
+            if entry["sha256"] == digest:
+                return {name: value for name, value in entry.items() if name not in FILE_FIELDS}
+        return None
+
+    def record(self, stage: str, name: str, path) -> dict:
+        """Mesure le média et enregistre son entrée ; un contenu déjà mesuré n'est pas redécodé"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        digest = file_digest(path)
+        with self._lock:
+            media = self._measured(stage, digest)
+        if media is None:
+            media = MEASURES[stage](path)
+
+        entry = {"path": path, "sha256": digest, "bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns, **media}
+        with self._lock:
+            self._stages.setdefault(stage, {})[name] = entry
+            self._save()
+        return entry
+
+    def _current(self, entry: dict) -> bool:
+        """True si le fichier a toujours le contenu à partir duquel l'entrée a été mesurée"""
+        try:
+            stat = os.stat(entry["path"])
+        except FileNotFoundError:
+            return False
+        if stat.st_size == entry["bytes"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        if stat.st_size != entry["bytes"] or file_digest(entry["path"]) != entry["sha256"]:
+            return False
+
+        # Même contenu sous un nouveau mtime (dossier de run copié) : conservé, avec le nouveau mtime
+        with self._lock:
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self._save()
+        return True
+
+    def get(self, stage: str, name: str) -> Optional[dict]:
+        """Entrée d'un média, None s'il n'est pas indexé ou a changé depuis"""
+        with self._lock:
+            entry = self._stages.get(stage, {}).get(name)
+        return entry if entry is not None and self._current(entry) else None
+
+    def verify(self, stage: str, name: str, path) -> bool:
+        """
+        True si le média à `path` est toujours celui indexé. Un média que l'index
+        ne connaît pas encore (dossier de run d'une version précédente) est mesuré maintenant.
+        """
+        with self._lock:
+            entry = self._stages.get(stage, {}).get(name)
+        if entry is None or entry["path"] != os.path.abspath(path):
+            self.record(stage, name, path)
+            return True
+        return self._current(entry)
+
+    def lookup(self, path) -> Optional[dict]:
+        """Entrée du média à `path`, quelle que soit son étape"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = next((entry for entries in self._stages.values() for entry in entries.values()
+                          if entry["path"] == path), None)
+        return entry if entry is not None and self._current(entry) else None
+
+    def duration(self, path) -> Optional[float]:
+        """Durée d'un fichier audio indexé, None s'il faut la mesurer"""
+        entry = self.lookup(path)
+        return entry.get("duration") if entry is not None else None
+
+    def digest(self, path) -> str:
+        """Empreinte d'un fichier (voir segment_cache.file_digest), tirée de l'index quand elle y est"""
+        entry = self.lookup(path)
+        return entry["sha256"] if entry is not None else file_digest(path)
+
+    def names_in(self, directory) -> List[str]:
+        """Noms des médias indexés de `directory`, comme os.listdir sans les autres fichiers"""
+        directory = os.path.abspath(directory)
+        with self._lock:
+            entries = [(name, entry) for entries in self._stages.values() for name, entry in entries.items()
+                       if os.path.dirname(entry["path"]) == directory]
+        return sorted(name for name, entry in entries if self._current(entry))
+
+    def prune(self, stage: str, keep: Iterable[str]) -> None:
+        """Oublie les médias d'une étape absents de `keep` (le Manifest supprime leurs fichiers)"""
+        keep = set(keep)
+        with self._lock:
+            entries = self._stages.get(stage, {})
+            for name in [name for name in entries if name not in keep]:
+                del entries[name]
+            self._save()
@@ -1,220 +1,680 @@
-from moviepy import ImageClip, AudioFileClip, concatenate_videoclips, VideoFileClip, concatenate_audioclips,vfx,  AudioClip, CompositeVideoClip,  CompositeAudioClip, afx, TextClip, ColorClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from moviepy.tools import subprocess_call
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+from PIL import Image, ImageDraw
+import logging
 import os
-from PIL import Image
-import math
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import time
 import numpy as np
-import random 
-def zoom_in_effect(clip, zoom_ratio=0.04):
-    def effect(get_frame, t):
-        img = Image.fromarray(get_frame(t))
-        base_size = img.size
-
-        new_size = [
-            math.ceil(img.size[0] * (1 + (zoom_ratio * t))),
-            math.ceil(img.size[1] * (1 + (zoom_ratio * t)))
-        ]
+import proglog
+import random
+from ken_burns import apply_effect, ZOOM_IN, ZOOM_OUT, LEFT_TO_RIGHT
+from asset_cache import AssetCache, get_asset_cache
+from ingest import OUTPUT_SIZE
+from config import DRAFT_PROFILE, TIKTOK_PROFILE, EncoderProfile
+from segment_cache import SegmentCache, file_digest
+from telemetry import get_telemetry
+from audio_track import frame_count, mux_soundtrack, soundtrack_blocks
+from captions import load_font
+from fanout import FrameFanOut, TargetView, master_size
+from media_index import MediaIndex
 
-        # The new dimensions must be even.
-        new_size[0] = new_size[0] + (new_size[0] % 2)
-        new_size[1] = new_size[1] + (new_size[1] % 2)
+def zoom_in_effect(clip, zoom_ratio=0.04):
+    return apply_effect(clip, ZOOM_IN, zoom_ratio)
 
-        img = img.resize(new_size, Image.LANCZOS)
+def zoom_out_effect(clip, zoom_ratio=0.04):
+    return apply_effect(clip, ZOOM_OUT, zoom_ratio)
 
-        x = math.ceil((new_size[0] - base_size[0]) / 2)
-        y = math.ceil((new_size[1] - base_size[1]) / 2)
+def left_to_right_smooth_travel_effect(clip, travel_ratio=0.02):
+    return apply_effect(clip, LEFT_TO_RIGHT, travel_ratio)
 
-        img = img.crop([
-            x, y, new_size[0] - x, new_size[1] - y
-        ]).resize(base_size, Image.LANCZOS)
 
-        result = np.array(img)
-        img.close()
+@dataclass
+class ClipSpec:
+    """Description d'un plan : une image fixe, sa voix et son effet éventuel."""
+    image: str
+    audio: str  # "" : pas de voix, le plan est muet (substitut du brouillon)
+    effect: Optional[str] = None
+    ratio: float = 0.0
+    duration: Optional[float] = None  # None : durée de l'audio
+    frames: Optional[int] = None  # nombre de frames, fixé par quantize_segments
+    caption: Optional[str] = None  # texte incrusté en bas de l'image
 
-        return result
 
-    return clip.transform(effect)
+@dataclass
+class Segment:
+    """Unité de rendu : l'intro, un triplet question/pause/réponse ou l'appel."""
+    name: str
+    clips: List[ClipSpec] = field(default_factory=list)
 
-def zoom_out_effect(clip, zoom_ratio=0.04):
-    def effect(get_frame, t):
-        img = Image.fromarray(get_frame(t))
-        base_size = img.size
 
-        initial_size = [
-            math.ceil(img.size[0] * 0.70),
-            math.ceil(img.size[1] * 0.70)
-        ]
+@dataclass(frozen=True)
+class OutputTarget:
+    """Format de sortie : une vidéo à sa résolution, avec son profil d'encodage."""
+    output_file: str
+    size: Tuple[int, int]
+    profile: Optional[EncoderProfile] = None  # None : profil de create_educational_video
 
-        current_size = [
-            math.ceil(img.size[0] * (1 - (zoom_ratio * t))),
-            math.ceil(img.size[1] * (1 - (zoom_ratio * t)))
-        ]
 
-        # The new dimensions must be even.
-        initial_size[0] = initial_size[0] + (initial_size[0] % 2)
-        initial_size[1] = initial_size[1] + (initial_size[1] % 2)
-        current_size[0] = current_size[0] + (current_size[0] % 2)
-        current_size[1] = current_size[1] + (current_size[1] % 2)
+STATIC_MEDIA_DIR = os.path.abspath("static_media")
 
-        img = img.resize(current_size, Image.LANCZOS)
 
-        x = math.ceil((current_size[0] - initial_size[0]) / 2)
-        y = math.ceil((current_size[1] - initial_size[1]) / 2)
+def _keep(path):
+    """
+    Seuls les fichiers de static_media, communs à toutes les vidéos, restent en
+    cache ; les images et voix d'un quiz sont libérées dès que leur plan est fini.
+    """
+    return os.path.abspath(path).startswith(STATIC_MEDIA_DIR + os.sep)
 
-        img = img.crop([
-            x, y, current_size[0] - x, current_size[1] - y
-        ]).resize(base_size, Image.LANCZOS)
 
-        result = np.array(img)
-        img.close()
+def _intro_image(quiz_type):
+    return os.path.join(
+        "static_media",
+        "history.png" if quiz_type.lower() == "histoire"
+        else "geography.png" if quiz_type.lower() == "geographie"
+        else "science.png" if quiz_type.lower() == "science"
+        else "general_knowledge.png"
+    )
 
-        return result
 
-    return clip.transform(effect)
+def _segment_rng(name, *images, digest=file_digest):
+    """
+    Tirage des effets d'un segment, initialisé par son nom et le contenu de ses images.
 
-def left_to_right_smooth_travel_effect(clip, travel_ratio=0.02):
-    def effect(get_frame, t):
-        img = Image.fromarray(get_frame(t))
-        base_size = img.size
+    Les voix n'y entrent pas : comme dans la clé du cache de segments, une voix
+    refaite ne change que la durée des plans. Un segment dont les images n'ont pas
+    changé garde donc les mêmes effets d'un rendu à l'autre.
+    """
+    return random.Random("/".join([name] + [digest(path) for path in images]))
 
-        # Calculate the horizontal travel distance
-        travel_distance = math.ceil(base_size[0] * travel_ratio * t)
 
-        # Ensure the crop stays within bounds
-        left = min(travel_distance, base_size[0])
-        right = min(left + base_size[0], base_size[0])
+def _question_effect(rng=random):
+    rd = rng.randint(1, 3)
+    if rd == 1:
+        return ZOOM_IN, 0.04
+    elif rd == 2:
+        return ZOOM_OUT, 0.04
+    return LEFT_TO_RIGHT, 0.02
 
-        # Crop and resize back to the original size
-        img = img.crop([left, 0, right, base_size[1]])
-        img = img.resize(base_size, Image.LANCZOS)
 
-        result = np.array(img)
-        img.close()
+def _appel_effect(rng=random):
+    # Seul le tirage 1 anime l'appel, les autres le laissent fixe.
+    rd = rng.randint(1, 3)
+    if rd == 1:
+        return ZOOM_IN, 0.04
+    return None, 0.0
 
-        return result
 
-    return clip.transform(effect)
+def _answer_effect(rng=random):
+    rd = rng.randint(1, 2)
+    if rd == 1:
+        return ZOOM_IN, 0.04
+    return ZOOM_OUT, 0.04
 
 
-def create_educational_video(images_dir, audio_dir, output_file="output.mp4", quiz_type = 'histoire'):
+def plan_segments(images_dir, audio_dir, quiz_type='histoire', num_questions=None, captions=None,
+                  media_index: Optional[MediaIndex] = None) -> List[Segment]:
     """
-    Crée une vidéo éducative à partir d'images et fichiers audio.
-    
-    Args:
-        images_dir (str): Chemin vers le dossier contenant les images
-        audio_dir (str): Chemin vers le dossier contenant les fichiers audio
-        output_file (str): Nom du fichier de sortie
+    Découpe la vidéo en segments dans l'ordre de diffusion.
+
+    Les effets aléatoires sont tirés ici, une seule fois, pour que le rendu
+    séquentiel et le rendu parallèle produisent la même vidéo ; chaque segment
+    a son propre tirage, déterminé par ses images. Sans num_questions, le nombre
+    de questions est celui des images présentes.
+    `captions` associe le nom d'un fichier voix au texte à incruster : l'intro,
+    chaque question (pause comprise) et chaque réponse affichent leur texte.
+    Avec `media_index`, les empreintes des fichiers et la liste des images
+    viennent de l'index du dossier de travail au lieu des fichiers eux-mêmes.
     """
-    
-    # Liste pour stocker les clips
-    clips = []
-    fixed_size = (1920, 1080)
-
-    # Ajout de l'introduction
-    intro_audio = os.path.join(audio_dir, "Introduction.mp3")
-    intro_image = os.path.join(
-        "static_media", 
-        "history.png" if quiz_type.lower() == "histoire" 
-        else "geography.png" if quiz_type.lower() == "geographie" 
-        else "science.png" if quiz_type.lower() == "science" 
-        else "general_knowledge.png"
-    )
-
-    print("Ajout de l'introduction...")
-    intro_audio_clip = AudioFileClip(intro_audio)
-    intro_duration = intro_audio_clip.duration  # Obtenir la durée directement
-    intro_clip = (ImageClip(intro_image)
-                    .with_duration(intro_duration)
-                    .with_audio(intro_audio_clip)) 
-    clips.append(intro_clip)
+    captions = captions or {}
+    digest = media_index.digest if media_index is not None else file_digest
+    segments = [Segment("intro", [ClipSpec(
+        image=_intro_image(quiz_type),
+        audio=os.path.join(audio_dir, "Introduction.mp3"),
+        caption=captions.get("Introduction.mp3"),
+    )])]
 
-    
     # Détermine le nombre de questions basé sur les fichiers présents
-    question_files = sorted([f for f in os.listdir(images_dir) if f.startswith('q')])
-    num_questions = len(question_files)
-    
+    if num_questions is None:
+        names = (media_index.names_in(images_dir) if media_index is not None else []) or os.listdir(images_dir)
+        question_files = sorted([f for f in names if f.startswith('q')])
+        num_questions = len(question_files)
+
     for i in range(1, num_questions + 1):
         if i == num_questions:
-            appel_abonnement_image = os.path.join("static_media", "general_knowledge.png")
-            appel_abonnement_audio = os.path.join(audio_dir, "Appel.mp3")
-            appel_abonnement_audio_clip = AudioFileClip(appel_abonnement_audio)
-            appel_abonnement_duration = appel_abonnement_audio_clip.duration
-            appel_clip = (ImageClip(appel_abonnement_image)
-                        .with_duration(appel_abonnement_duration)
-                        .with_audio(appel_abonnement_audio_clip))
-            rd = random.randint(1, 3)
-            if rd == 1:
-                appel_clip = zoom_in_effect(appel_clip, 0.04)
-            elif rd == 2:
-                question_clip = zoom_out_effect(appel_clip, 0.04)
-            else :
-                question_clip = left_to_right_smooth_travel_effect(appel_clip, travel_ratio=0.02)
-            clips.append(appel_clip)
-        # Question
+            appel_image = os.path.join("static_media", "general_knowledge.png")
+            appel_audio = os.path.join(audio_dir, "Appel.mp3")
+            effect, ratio = _appel_effect(_segment_rng("appel", appel_image, digest=digest))
+            segments.append(Segment("appel", [ClipSpec(
+                image=appel_image,
+                audio=appel_audio,
+                effect=effect,
+                ratio=ratio,
+            )]))
+
         question_image = os.path.join(images_dir, f"q{i}.png")
         question_audio = os.path.join(audio_dir, f"Question_{i}.mp3")
-        
-        
-        # Charge l'audio de la question pour obtenir sa durée
-        question_audio_clip = AudioFileClip(question_audio)
-        question_duration = question_audio_clip.duration
-        
-        # Crée le clip de la question
-        question_clip = (ImageClip(question_image)
-                        .with_duration(question_duration)
-                        .with_audio(question_audio_clip))
-        
-        rd = random.randint(1, 3)
-
-        if rd == 1:
-            question_clip = zoom_in_effect(question_clip, 0.04)
-        elif rd == 2:
-            question_clip = zoom_out_effect(question_clip, 0.04)
-        else :
-            question_clip = left_to_right_smooth_travel_effect(question_clip, travel_ratio=0.02)
-        clips.append(question_clip)
-        
-        # Ajoute une pause de 4 secondes (image de la question sans son)
-        pause_audio_clip = (AudioFileClip(os.path.join("static_media", "chronometre.mp3")).subclipped(0, 4))
-        pause_clip = (ImageClip(question_image)
-                      .with_duration(3)
-                      .with_audio(pause_audio_clip))
-        clips.append(pause_clip)
-        
-        # Réponse
         answer_image = os.path.join(images_dir, f"r{i}.png")
         answer_audio = os.path.join(audio_dir, f"Reponse_{i}.mp3")
-        
-        # Charge l'audio de la réponse pour obtenir sa durée
-        answer_audio_clip = AudioFileClip(answer_audio)
-        answer_duration = answer_audio_clip.duration
-        
-        # Crée le clip de la réponse
-        answer_clip = (ImageClip(answer_image)
-                      .with_duration(answer_duration)
-                      .with_audio(answer_audio_clip))
-        
-        rd = random.randint(1, 2)
-        if rd == 1:
-            answer_clip = zoom_in_effect(answer_clip, 0.04)
-        elif rd == 2 :
-            answer_clip = zoom_out_effect(answer_clip, 0.04)
-        else :
-            question_clip = left_to_right_smooth_travel_effect(question_clip, travel_ratio=0.02)
-        clips.append(answer_clip)
-    
-    # Assemble tous les clips
-    final_clip = concatenate_videoclips(clips)
-    
-    # Exporte la vidéo
-    final_clip.write_videofile(output_file, 
-                             fps=24, 
-                             audio_codec='aac',
-                             audio_bitrate='192k')
-    
-    # Nettoie la mémoire
-    final_clip.close()
-    for clip in clips:
-        clip.close()
+        rng = _segment_rng(f"question_{i}", question_image, answer_image, digest=digest)
+        effect, ratio = _question_effect(rng)
+        question = ClipSpec(
+            image=question_image,
+            audio=question_audio,
+            effect=effect,
+            ratio=ratio,
+            caption=captions.get(f"Question_{i}.mp3"),
+        )
+        # Pause de 3 secondes sur l'image de la question avec le chronomètre,
+        # la bande son coupe le chronomètre à la fin de la pause
+        pause = ClipSpec(
+            image=question_image,
+            audio=os.path.join("static_media", "chronometre.mp3"),
+            duration=3,
+            caption=question.caption,
+        )
+        effect, ratio = _answer_effect(rng)
+        answer = ClipSpec(
+            image=answer_image,
+            audio=answer_audio,
+            effect=effect,
+            ratio=ratio,
+            caption=captions.get(f"Reponse_{i}.mp3"),
+        )
+        segments.append(Segment(f"question_{i}", [question, pause, answer]))
+
+    return segments
+
+
+def quantize_segments(segments: List[Segment], fps=24, cache: AssetCache = None,
+                      media_index: Optional[MediaIndex] = None):
+    """
+    Fixe le nombre de frames de chaque plan.
+
+    La durée d'un plan (la sienne ou celle de sa voix) est arrondie à la frame :
+    la vidéo et la bande son sont découpées sur les mêmes frontières. La durée
+    d'une voix est lue dans `media_index` quand elle y est ; seules les autres
+    (substituts du brouillon, fichiers modifiés depuis) sont décodées.
+    """
+    cache = cache or get_asset_cache()
+    for segment in segments:
+        for spec in segment.clips:
+            duration = spec.duration
+            if duration is None and media_index is not None:
+                duration = media_index.duration(spec.audio)
+            if duration is None:
+                duration = cache.audio_duration(spec.audio)
+            spec.frames = frame_count(duration, fps)
+    return segments
+
+
+def soundtrack_for(segments: List[Segment], fps=24, cache: AssetCache = None):
+    """
+    Bande son, plan par plan : la voix de chaque plan placée sur ses frames.
+
+    Chaque voix n'est décodée qu'au moment où son bloc est envoyé à ffmpeg,
+    puis libérée : la mémoire ne dépend pas de la durée de la vidéo. Un plan
+    sans voix reçoit un silence, complété par soundtrack_blocks jusqu'à sa
+    dernière frame.
+    """
+    cache = cache or get_asset_cache()
+    return soundtrack_blocks(
+        ((cache.audio(spec.audio, keep=_keep(spec.audio)) if spec.audio else np.zeros((0, 2), dtype=np.float32),
+          spec.frames)
+         for segment in segments for spec in segment.clips),
+        fps
+    )
+
+
+def preload_static_media(sizes=(OUTPUT_SIZE,), cache: AssetCache = None):
+    """
+    Décode une fois les images et sons de static_media dans le cache du processus.
+
+    Utilisé par le service (service.py) au démarrage de chaque processus de rendu.
+    """
+    cache = cache or get_asset_cache()
+    for name in sorted(os.listdir("static_media")):
+        path = os.path.join("static_media", name)
+        if name.endswith(".png"):
+            for size in sizes:
+                cache.image(path, tuple(size))
+        elif name.endswith(".mp3"):
+            cache.audio(path)
+
+
+def build_clip(spec: ClipSpec, size=None, cache: AssetCache = None, fps=24):
+    """Construit le clip moviepy (sans audio ni sous-titre) d'un plan à partir des images en cache."""
+    cache = cache or get_asset_cache()
+    duration = spec.frames / fps if spec.frames is not None else (
+        spec.duration if spec.duration is not None else cache.audio_duration(spec.audio))
+
+    clip = cache.image_clip(spec.image, size, keep=_keep(spec.image)).with_duration(duration)
+    if spec.effect is not None:
+        clip = apply_effect(clip, spec.effect, spec.ratio, fps=fps)
+    return clip
+
+
+def _write_clips(specs: List[ClipSpec], targets: List[OutputTarget], size, logger="bar"):
+    """
+    Encode les plans à la suite, sans piste audio, dans chaque format de sortie.
+
+    Chaque plan donne exactement son nombre de frames, la bande son est ajoutée
+    une seule fois sur la vidéo finale. Le clip d'un plan n'est construit qu'au
+    moment d'écrire ses frames et fermé juste après : un seul plan est ouvert
+    à la fois, quel que soit le nombre de questions.
+
+    Chaque frame est calculée une seule fois à la taille `size`, puis recadrée
+    et sous-titrée pour chaque cible en parallèle ; son encodeur la met à
+    l'échelle (voir fanout.py). Le sous-titre, pixellisé une fois par plan
+    (voir captions.py), est fondu après l'effet de mouvement pour rester fixe
+    à l'écran.
+    """
+    logger = proglog.default_bar_logger(logger)
+    fps = targets[0].profile.fps
+    views = [TargetView(size, target.size) for target in targets]
+    writers = []
+    fanout = None
+    try:
+        for target, view in zip(targets, views):
+            profile = target.profile
+            writers.append(FFMPEG_VideoWriter(
+                target.output_file, view.crop_size, fps, codec=profile.codec, preset=profile.preset,
+                ffmpeg_params=view.scale_params() + profile.rate_params() + profile.thread_params()
+            ))
+        fanout = FrameFanOut(views, [writer.write_frame for writer in writers])
+        for spec in logger.iter_bar(clip=specs):
+            clip = build_clip(spec, size, fps=fps)
+            fanout.set_caption(spec.caption)
+            try:
+                for index in range(spec.frames):
+                    fanout.write_frame(clip.get_frame(index / fps))
+            finally:
+                clip.close()
+    finally:
+        if fanout is not None:
+            fanout.close()
+        for writer in writers:
+            writer.close()
+
+
+@dataclass
+class PieceResult:
+    """Morceau encodé d'un segment (un fichier par cible) et le temps passé à l'encoder."""
+    paths: List[str]
+    static: bool
+    duration: float
+    elapsed: float
+
+
+# Options x264 qui ne changent ni le SPS ni le PPS du preset utilisé
+STILL_X264_PARAMS = "me=dia:subme=1:trellis=0:rc-lookahead=10:partitions=none:mixed-refs=0"
+
+
+def is_static(spec: ClipSpec) -> bool:
+    """Un plan sans effet affiche la même image du début à la fin."""
+    return spec.effect is None
+
+
+def encode_still(spec: ClipSpec, targets: List[OutputTarget], size=None, cache: AssetCache = None):
+    """
+    Encode un plan fixe en mode image fixe, sans piste audio, dans chaque format.
+
+    L'image est décodée et envoyée une seule fois à ffmpeg, le filtre loop la
+    répète pour chaque frame : pas de composition ni de transfert par frame.
+    Les réglages d'encodage sont ceux de write_videofile pour que le morceau
+    se concatène sans ré-encodage avec les morceaux animés ; seules les options
+    d'analyse de x264 (sans effet sur les en-têtes du flux) sont allégées,
+    une image fixe n'ayant aucun mouvement à estimer. Le recadrage, le
+    sous-titre et la mise à l'échelle de chaque format sont appliqués une
+    seule fois sur l'image envoyée, les encodeurs des formats tournent en
+    parallèle.
+    """
+    cache = cache or get_asset_cache()
+    fps = targets[0].profile.fps
+    frame = cache.image(spec.image, size, keep=_keep(spec.image))
+    if spec.frames is not None:
+        num_frames = spec.frames
+    else:
+        duration = spec.duration if spec.duration is not None else cache.audio_duration(spec.audio)
+        num_frames = frame_count(duration, fps)
+
+    def encode(target: OutputTarget):
+        view = TargetView(frame.shape[1::-1], target.size)
+        view.set_caption(spec.caption)
+        still = view.frame(frame)
+        height, width = still.shape[:2]
+        profile = target.profile
+        filters = [view.scale_filter(), "loop=loop=-1:size=1:start=0"]
+        cmd = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{width}x{height}",
+            "-pix_fmt", "rgb24", "-r", "%.02f" % fps, "-an", "-i", "-",
+            "-vf", ",".join(f for f in filters if f), "-frames:v", str(num_frames),
+            "-vcodec", profile.codec, "-preset", profile.preset,
+            *(["-x264-params", STILL_X264_PARAMS] if profile.codec == "libx264" else []),
+            *profile.rate_params(), *profile.thread_params(),
+            "-pix_fmt", "yuv420p", target.output_file,
+        ]
+        proc = subprocess.run(cmd, input=still.tobytes(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if proc.returncode:
+            raise IOError(proc.stderr.decode("utf8", errors="replace"))
+
+    if len(targets) == 1:
+        encode(targets[0])
+    else:
+        with ThreadPoolExecutor(len(targets)) as pool:
+            list(pool.map(encode, targets))
+    return num_frames / fps
+
+
+def render_segment(segment: Segment, targets: List[OutputTarget], size=None,
+                   static_fast_path=True) -> List[PieceResult]:
+    """
+    Encode un segment dans chaque format (appelé dans un processus du pool).
+
+    `targets` donne, pour chaque format, le fichier du segment et son profil.
+    Les plans fixes passent par encode_still, les plans animés consécutifs sont
+    encodés ensemble par moviepy. Renvoie les morceaux dans l'ordre.
+    """
+    pieces = []
+    runs = []
+    for spec in segment.clips:
+        static = static_fast_path and is_static(spec)
+        if runs and not static and not runs[-1][0]:
+            runs[-1][1].append(spec)
+        else:
+            runs.append((static, [spec]))
+
+    for index, (static, specs) in enumerate(runs):
+        piece_targets = [replace(target, output_file=f"{os.path.splitext(target.output_file)[0]}_{index}.mp4")
+                         for target in targets]
+        start = time.perf_counter()
+        if static:
+            duration = encode_still(specs[0], piece_targets, size)
+        else:
+            duration = sum(spec.frames for spec in specs) / targets[0].profile.fps
+            _write_clips(specs, piece_targets, size, logger=None)
+        pieces.append(PieceResult([target.output_file for target in piece_targets], static, duration,
+                                  time.perf_counter() - start))
+    return pieces
+
+
+def concat_segments(segment_files, output_file):
+    """Assemble les segments encodés sans ré-encodage (démultiplexeur concat de ffmpeg)."""
+    list_file = output_file + ".segments.txt"
+    with open(list_file, "w", encoding="utf-8") as f:
+        for path in segment_files:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        subprocess_call([
+            FFMPEG_BINARY, "-y", "-f", "concat", "-safe", "0", "-i", list_file,
+            "-c", "copy", "-movflags", "+faststart", output_file,
+        ], logger=None)
+    finally:
+        os.remove(list_file)
+
+
+def report_static_fast_path(pieces: List[PieceResult]):
+    """
+    Journalise le temps gagné par le chemin rapide des plans fixes.
+
+    Le coût sans chemin rapide est estimé à partir du coût par seconde de vidéo
+    des morceaux encodés par moviepy pendant ce même rendu.
+    """
+    static = [p for p in pieces if p.static]
+    animated = [p for p in pieces if not p.static]
+    if not static:
+        return None
+    static_duration = sum(p.duration for p in static)
+    static_elapsed = sum(p.elapsed for p in static)
+    animated_duration = sum(p.duration for p in animated)
+    saved = None
+    if animated_duration > 0:
+        cost_per_second = sum(p.elapsed for p in animated) / animated_duration
+        saved = static_duration * cost_per_second - static_elapsed
+
+    message = (f"Chemin rapide : {len(static)} plans fixes ({static_duration:.1f}s de vidéo) "
+               f"encodés en {static_elapsed:.1f}s")
+    if saved is not None:
+        message += f", gain estimé {saved:.1f}s"
+    print(message)
+    logging.info(message)
+    return saved
+
+
+# Brouillon : rendu en quelques secondes pour valider le quiz avant de payer les médias
+DRAFT_SIZE = (270, 480)
+DRAFT_CHARS_PER_SECOND = 15  # débit de lecture estimé de la voix
+
+
+def _placeholder_image(text, path, size):
+    """Carte grise portant le texte du plan, à la place d'une image pas encore générée."""
+    img = Image.new("RGB", size, (60, 60, 70))
+    draw = ImageDraw.Draw(img)
+    font = load_font(max(12, size[0] // 16))
+    lines = textwrap.wrap(text or "", width=22)[:12]
+    draw.multiline_text((size[0] // 2, size[1] // 2), "\n".join(lines), font=font,
+                        fill=(235, 235, 235), anchor="mm", align="center")
+    img.save(path)
+
+
+def prepare_draft_assets(segments: List[Segment], texts: Dict[str, str], work_dir, size=DRAFT_SIZE,
+                         ready: Optional[List[str]] = None):
+    """
+    Remplace les images et voix manquantes par des substituts.
+
+    `texts` associe le nom de chaque fichier voix au texte lu. Une voix manquante
+    devient un plan muet de la durée estimée de sa lecture (rien n'est écrit ni
+    décodé, voir soundtrack_for), une image manquante
+    une carte portant le texte du premier plan qui l'affiche (sans sous-titre,
+    la carte montrant déjà le texte). Avec `ready`, seuls ces fichiers (déjà
+    produits pour ce quiz) et ceux de static_media sont utilisés : une image ou
+    une voix d'un quiz précédent resté dans le dossier est aussi remplacée.
+    """
+    ready = None if ready is None else {os.path.abspath(path) for path in ready}
+
+    def missing(path):
+        if not os.path.exists(path):
+            return True
+        return ready is not None and not _keep(path) and os.path.abspath(path) not in ready
+
+    placeholders = {}
+    for segment in segments:
+        for spec in segment.clips:
+            name = os.path.basename(spec.audio)
+            text = texts.get(name, "")
+            if spec.image not in placeholders and missing(spec.image):
+                placeholders[spec.image] = os.path.join(work_dir, os.path.basename(spec.image))
+                _placeholder_image(text, placeholders[spec.image], size)
+            if spec.image in placeholders:
+                spec.image = placeholders[spec.image]
+                spec.caption = None
+
+            if missing(spec.audio):
+                spec.duration = max(1.0, len(text) / DRAFT_CHARS_PER_SECOND)
+                spec.audio = ""
+    return segments
+
+
+def create_educational_video(images_dir, audio_dir, output_file="output.mp4", quiz_type = 'histoire', workers=1,
+                             static_fast_path=True, size=OUTPUT_SIZE, draft=False, texts=None, num_questions=None,
+                             profile: Optional[EncoderProfile] = None, segment_cache: Optional[SegmentCache] = None,
+                             executor=None, captions=None, targets: Optional[List[OutputTarget]] = None,
+                             media_index: Optional[MediaIndex] = None, draft_media: Optional[List[str]] = None):
+    """
+    Crée une vidéo éducative à partir d'images et fichiers audio.
+
+    Args:
+        images_dir (str): Chemin vers le dossier contenant les images
+        audio_dir (str): Chemin vers le dossier contenant les fichiers audio
+        output_file (str): Nom du fichier de sortie
+        quiz_type (str): Type de quiz, choisit l'image d'introduction
+        workers (int): Nombre de processus de rendu. Au-delà de 1, chaque segment
+            est encodé par un processus du pool puis les segments sont concaténés
+            sans ré-encodage.
+        static_fast_path (bool): Encode les plans sans effet (intro, pauses, appel)
+            en mode image fixe au lieu de les composer frame par frame.
+        size (tuple): Résolution (largeur, hauteur) de la vidéo. Les images sont
+            recadrées une fois à cette taille (voir ingest.py) puis lues en
+            memory-map.
+        draft (bool): Brouillon basse résolution (DRAFT_SIZE, profil DRAFT_PROFILE
+            par défaut) pour valider le quiz. Les images et voix pas encore
+            générées sont remplacées par des substituts.
+        texts (dict): En brouillon, texte lu par chaque fichier voix (voir
+            VoiceGenerator.voice_parts), pour les substituts.
+        draft_media (list): En brouillon, images et voix déjà produites pour ce
+            quiz (voir VoiceGenerator.current_files) ; les autres fichiers des
+            dossiers, d'un quiz précédent, sont remplacés par des substituts.
+            None : tout fichier présent est utilisé.
+        num_questions (int): Nombre de questions, par défaut celui des images présentes.
+        profile (EncoderProfile): Codec, preset, qualité, threads et fps de l'encodage
+            (TIKTOK_PROFILE par défaut). Avec threads à 0, les cœurs sont répartis
+            entre les processus de rendu et les formats de sortie.
+        segment_cache (SegmentCache): Segments déjà encodés par un rendu précédent.
+            Seuls les segments dont une image, un effet, une durée ou le profil
+            a changé sont encodés, les autres sont repris tels quels.
+        executor (Executor): Pool de processus de rendu déjà démarré (service.py),
+            utilisé à la place d'un pool créé pour cette vidéo quand workers > 1.
+        captions (dict): Sous-titres de l'intro, des questions et des réponses, par
+            nom de fichier voix (voir VoiceGenerator.voice_parts). Chaque texte est
+            pixellisé une fois par segment avec les glyphes en cache, puis fondu
+            sur les frames : une seule opération par frame.
+        targets (list): Formats de sortie (OutputTarget) rendus en une seule passe,
+            à la place de output_file et size, par exemple la vidéo verticale,
+            sa version horizontale et une version 720p. Les images, les effets
+            et la bande son sont calculés une fois, à la taille du plus grand
+            format ; chaque frame est ensuite recadrée au centre, mise à
+            l'échelle, sous-titrée et encodée pour chaque format en parallèle
+            (voir fanout.py). Tous les formats ont le même fps. Ignoré en
+            brouillon.
+        media_index (MediaIndex): Index des images et voix du dossier de travail
+            (durées, empreintes), rempli par les générateurs : le plan de la
+            vidéo est établi sans ouvrir un seul média.
+
+    Les plans sont encodés sans audio. La bande son est produite une seule fois,
+    chaque voix placée sur les frames de son plan, puis multiplexée avec la
+    vidéo finale.
+
+    Le rendu suit la timeline : les images et voix d'un plan ne sont ouvertes
+    que pendant son encodage et libérées ensuite (seul static_media reste en
+    cache), si bien que la mémoire reste à peu près constante quel que soit le
+    nombre de questions (voir benchmark_memory.py).
+    """
+    if draft or targets is None:
+        targets = [OutputTarget(output_file, DRAFT_SIZE if draft else tuple(size), profile)]
+    default_profile = profile or (DRAFT_PROFILE if draft else TIKTOK_PROFILE)
+    targets = [replace(target, size=tuple(target.size), profile=target.profile or default_profile)
+               for target in targets]
+    fps = targets[0].profile.fps
+    if any(target.profile.fps != fps for target in targets):
+        raise ValueError("Tous les formats de sortie doivent avoir le même nombre d'images par seconde")
+    if draft:
+        workers = 1
+    # La timeline est calculée une fois, à la taille du plus grand format
+    size = master_size([target.size for target in targets])
+    encoders = workers * len(targets)
+    if encoders > 1:
+        # Un encodeur par processus et par format : sans limite, chacun lancerait un thread par cœur
+        targets = [target if target.profile.threads else
+                   replace(target, profile=replace(target.profile, threads=max(1, (os.cpu_count() or 1) // encoders)))
+                   for target in targets]
+
+    segments = plan_segments(images_dir, audio_dir, quiz_type, num_questions, captions, media_index)
+    telemetry = get_telemetry()
+    segment_dir = tempfile.mkdtemp(prefix="segments_",
+                                   dir=os.path.dirname(os.path.abspath(targets[0].output_file)))
+    video_files = [os.path.join(segment_dir, f"video_{index}.mp4") for index in range(len(targets))]
+    pieces = []
+    try:
+        if draft:
+            prepare_draft_assets(segments, texts or {}, segment_dir, size, draft_media)
+        quantize_segments(segments, fps, media_index=media_index)
+
+        profile = targets[0].profile
+        with telemetry.span("montage.render", workers=workers, draft=draft, profile=profile.name,
+                            preset=profile.preset, targets=len(targets)) as span:
+            span["frames"] = sum(spec.frames for segment in segments for spec in segment.clips)
+            if workers <= 1 and not static_fast_path:
+                print("Ajout de l'introduction...")
+                specs = [spec for segment in segments for spec in segment.clips]
+                _write_clips(specs, [replace(target, output_file=video_file)
+                                     for target, video_file in zip(targets, video_files)], size)
+            else:
+                # Fichier de chaque segment dans chaque format
+                segment_files = [[os.path.join(segment_dir, f"{index:03d}_{segment.name}_{number}.mp4")
+                                  for number in range(len(targets))]
+                                 for index, segment in enumerate(segments)]
+
+                # Les segments inchangés depuis un rendu précédent sont repris du cache, format par format
+                keys = [[None] * len(targets) for _ in segments]
+                if segment_cache is not None and not draft:
+                    digest = media_index.digest if media_index is not None else file_digest
+                    keys = [[segment_cache.key(segment, target.size, target.profile, static_fast_path, size, digest)
+                             for target in targets] for segment in segments]
+                todo = []
+                for index in range(len(segments)):
+                    missing = [number for number, key in enumerate(keys[index])
+                               if key is None or not segment_cache.fetch(key, segment_files[index][number])]
+                    if missing:
+                        todo.append((index, missing))
+                cached = len(segments) * len(targets) - sum(len(missing) for _, missing in todo)
+                if cached:
+                    print(f"{cached} segments repris du cache")
+                    span["cached_segments"] = cached
+
+                args = ([segments[index] for index, _ in todo],
+                        [[replace(targets[number], output_file=segment_files[index][number]) for number in missing]
+                         for index, missing in todo],
+                        [size] * len(todo), [static_fast_path] * len(todo))
+                if not todo:
+                    results = []
+                elif workers > 1 and len(todo) > 1:
+                    print(f"Rendu de {len(todo)} segments sur {workers} processus...")
+                    if executor is not None:
+                        results = list(executor.map(render_segment, *args))
+                    else:
+                        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+                            results = list(pool.map(render_segment, *args))
+                else:
+                    print(f"Rendu de {len(todo)} segments...")
+                    results = list(map(render_segment, *args))
+
+                for (index, missing), segment_pieces in zip(todo, results):
+                    # Les segments sont mesurés dans les processus du pool, on les enregistre ici
+                    for piece in segment_pieces:
+                        frames = round(piece.duration * fps)
+                        telemetry.record("montage.segment", piece.elapsed, segment=segments[index].name,
+                                         static=piece.static, frames=frames, targets=len(missing),
+                                         fps=round(frames / piece.elapsed, 2) if piece.elapsed else None)
+                    for position, number in enumerate(missing):
+                        paths = [piece.paths[position] for piece in segment_pieces]
+                        if len(paths) == 1:
+                            os.replace(paths[0], segment_files[index][number])
+                        else:
+                            concat_segments(paths, segment_files[index][number])
+                        if keys[index][number] is not None:
+                            segment_cache.store(keys[index][number], segment_files[index][number])
+
+                pieces = [piece for segment_pieces in results for piece in segment_pieces]
+                with telemetry.span("montage.concat", segments=len(segment_files), targets=len(targets)):
+                    for number, video_file in enumerate(video_files):
+                        concat_segments([files[number] for files in segment_files], video_file)
+
+        # Une seule bande son, envoyée à ffmpeg plan par plan et multiplexée avec la vidéo de chaque format
+        with telemetry.span("montage.audio"):
+            mux_soundtrack(video_files, soundtrack_for(segments, fps),
+                           [target.output_file for target in targets])
+        if static_fast_path and not draft and pieces:
+            report_static_fast_path(pieces)
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
 
 # # Exemple d'utilisation
 # if __name__ == "__main__":
@@ -223,4 +683,4 @@ def create_educational_video(images_dir, audio_dir, output_file="output.mp4", qu
 #         audio_dir="video_data/01-18-25/voices",
 #         output_file="video_data/01-18-25/final_output.mp4",
 #         quiz_type='histoire'
-#     )
\ No newline at end of file
+#     )
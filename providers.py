@@ -0,0 +1,288 @@
+"""
+Couche asynchrone par laquelle passe chaque appel d'API du pipeline.
+
+`Providers` possède une boucle d'événements, qui tourne dans un thread de fond, et
+les clients des API OpenAI (chat et images), de l'API TTS d'ElevenLabs et des
+téléchargements d'images. Chacun est un `Provider` avec sa propre limite de
+concurrence, son seau à jetons, son délai par requête et ses reprises avec
+attente aléatoire sur 429/5xx et dépassements de délai. Les clients gardent
+leurs connexions keep-alive pendant toute la vie de l'objet : le service
+(service.py) les réutilise pour chaque tâche.
+
+Le code synchrone appelle `run(coro)` (ou `submit(coro)` pour un future) : les
+requêtes d'images et de voix de toute une étape média sont planifiées ensemble
+sur la boucle.
+
+Les clients par défaut sont AsyncOpenAI, AsyncElevenLabs et un httpx.AsyncClient.
+Des clients synchrones (openai.OpenAI, elevenlabs.ElevenLabs, requests.Session,
+ou les faux clients de fakes.py) peuvent être passés à la place : leurs appels
+tournent dans des threads.
+"""
+from concurrent.futures import Future
+from typing import AsyncIterator, Awaitable, Callable, Coroutine, Iterator, Optional, TypeVar
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+
+import httpx
+from elevenlabs.client import AsyncElevenLabs
+from openai import AsyncOpenAI
+
+from config import Config
+from telemetry import get_telemetry
+from throttling import RateLimiter, get_rate_limiter, retry_with_backoff_async
+
+T = TypeVar("T")
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 60.0
+_END = object()
+
+
+def _payload_size(messages: list) -> int:
+    return len(json.dumps(messages, ensure_ascii=False).encode("utf-8"))
+
+
+async def _iterate_in_thread(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Consomme un itérateur bloquant (un flux de SDK synchrone) sans bloquer la boucle"""
+    while True:
+        item = await asyncio.to_thread(next, iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+async def _save(chunks: AsyncIterator[bytes], path: str, span: dict) -> None:
+    """Écrit les morceaux à mesure qu'ils arrivent, puis met le fichier à sa place"""
+    # Nom unique : deux tâches peuvent écrire le même fichier (ex. un champ remplacé après le flux)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        span["response_bytes"] = 0
+        with open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                if chunk:
+                    f.write(chunk)
+                    span["response_bytes"] += len(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class Provider:
+    """Concurrence, limite de débit, délai et reprises d'une API"""
+
+    def __init__(self, name: str, concurrency: int, rate_limiter: Optional[RateLimiter] = None,
+                 timeout: float = 120.0, max_retries: int = 3):
+        self.name = name
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    async def call(self, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Attend `request()` dans les limites du provider, en reprenant les erreurs passagères.
+
+        L'attente entre deux tentatives se fait hors du sémaphore : une requête
+        freinée ne garde pas une place que d'autres requêtes pourraient utiliser.
+        """
+        async def attempt() -> T:
+            async with self.semaphore:
+                if self.rate_limiter is not None:
+                    with get_telemetry().span(f"throttle.{self.name}"):
+                        await self.rate_limiter.acquire_async()
+                # Une requête qui tourne dans un thread continue après son délai, seule l'attente s'arrête
+                return await asyncio.wait_for(request(), self.timeout)
+
+        return await retry_with_backoff_async(attempt, max_retries=self.max_retries)
+
+
+def _limiter(name: str, rate_per_minute: float, burst: int) -> Optional[RateLimiter]:
+    return get_rate_limiter(name, rate_per_minute, burst=burst) if rate_per_minute > 0 else None
+
+
+class Providers:
+    def __init__(self, config: Optional[Config] = None, openai=None, elevenlabs=None, http=None):
+        self.config = config or Config()
+        self._openai = openai
+        self._elevenlabs = elevenlabs
+        self._http = http
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+        config = self.config
+        self.openai_chat = Provider(
+            "openai-chat", config.BATCH_TEXT_WORKERS,
+            _limiter("openai-chat", config.CHAT_REQUESTS_PER_MINUTE, config.BATCH_TEXT_WORKERS),
+            timeout=config.API_TIMEOUT, max_retries=config.API_MAX_RETRIES
+        )
+        self.openai_images = Provider(
+            "openai-images", config.IMAGE_WORKERS,
+            _limiter("openai-images", config.IMAGE_REQUESTS_PER_MINUTE, config.IMAGE_WORKERS),
+            timeout=config.API_TIMEOUT, max_retries=config.API_MAX_RETRIES
+        )
+        self.image_download = Provider(
+            "image-download", config.IMAGE_WORKERS,
+            timeout=DOWNLOAD_TIMEOUT, max_retries=config.API_MAX_RETRIES
+        )
+        self.elevenlabs_tts = Provider(
+            "elevenlabs-tts", config.VOICE_WORKERS,
+            _limiter("elevenlabs-tts", config.VOICE_REQUESTS_PER_MINUTE, config.VOICE_WORKERS),
+            timeout=config.API_TIMEOUT, max_retries=config.VOICE_MAX_RETRIES
+        )
+
+    # Clients, créés à la première utilisation. Les reprises et les délais sont gérés par les providers.
+
+    @property
+    def http(self):
+        if self._http is None:
+            limits = httpx.Limits(max_connections=self.config.HTTP_MAX_CONNECTIONS,
+                                  max_keepalive_connections=self.config.HTTP_MAX_CONNECTIONS)
+            self._http = httpx.AsyncClient(limits=limits, timeout=None, follow_redirects=True)
+        return self._http
+
+    @property
+    def openai(self):
+        if self._openai is None:
+            self._openai = AsyncOpenAI(api_key=self.config.OPENAI_API_KEY, max_retries=0)
+        return self._openai
+
+    @property
+    def elevenlabs(self):
+        if self._elevenlabs is None:
+            # Partage le pool de connexions des téléchargements d'images
+            self._elevenlabs = AsyncElevenLabs(api_key=self.config.ELEVENLABS_API_KEY, timeout=None,
+                                               httpx_client=self.http)
+        return self._elevenlabs
+
+    @staticmethod
+    def _is_async(client) -> bool:
+        return isinstance(client, (AsyncOpenAI, AsyncElevenLabs, httpx.AsyncClient))
+
+    async def _invoke(self, client, func: Callable, **kwargs):
+        """Appelle une méthode du client, dans un thread si le client est synchrone"""
+        if self._is_async(client):
+            return await func(**kwargs)
+        return await asyncio.to_thread(func, **kwargs)
+
+    # Boucle d'événements
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="providers", daemon=True).start()
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Planifie une coroutine sur la boucle des providers depuis n'importe quel thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine[None, None, T]) -> T:
+        """Exécute une coroutine sur la boucle des providers et attend son résultat (pas depuis la boucle elle-même)"""
+        return self.submit(coro).result()
+
+    def iterate(self, iterator: AsyncIterator[T]) -> Iterator[T]:
+        """Consomme un itérateur asynchrone de la boucle des providers depuis du code synchrone"""
+        while True:
+            try:
+                yield self.run(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+
+    def warm_up(self) -> None:
+        """Démarre la boucle et crée les clients maintenant plutôt qu'à la première tâche"""
+        clients = (self.openai, self.elevenlabs, self.http)
+        self.run(asyncio.sleep(0))
+        logging.info(f"Providers ready: {', '.join(type(client).__name__ for client in clients)}")
+
+    def close(self) -> None:
+        """Ferme les pools de connexions et arrête la boucle"""
+        if self._loop is None:
+            return
+        if isinstance(self._openai, AsyncOpenAI):
+            self.run(self._openai.close())
+        if isinstance(self._http, httpx.AsyncClient):
+            self.run(self._http.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    # Appels d'API
+
+    async def chat(self, messages: list, model: str = "gpt-4") -> str:
+        async def request() -> str:
+            with get_telemetry().span("api.openai.chat", request_bytes=_payload_size(messages)) as span:
+                completion = await self._invoke(self.openai, self.openai.chat.completions.create,
+                                                model=model, messages=messages)
+                content = completion.choices[0].message.content
+                span["response_bytes"] = len(content.encode("utf-8"))
+            return content
+
+        return await self.openai_chat.call(request)
+
+    async def chat_stream(self, messages: list, model: str = "gpt-4") -> AsyncIterator[str]:
+        """
+        Produit les fragments de texte d'une complétion en flux.
+
+        L'ouverture du flux a les reprises et le délai de toute requête ; dès les
+        premiers octets reçus, la complétion est lue jusqu'au bout.
+        """
+        with get_telemetry().span("api.openai.chat", request_bytes=_payload_size(messages), stream=True) as span:
+            stream = await self.openai_chat.call(lambda: self._invoke(
+                self.openai, self.openai.chat.completions.create, model=model, messages=messages, stream=True
+            ))
+            if not self._is_async(self.openai):
+                stream = _iterate_in_thread(iter(stream))
+            span["response_bytes"] = 0
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    span["response_bytes"] += len(chunk.choices[0].delta.content.encode("utf-8"))
+                    yield chunk.choices[0].delta.content
+
+    async def generate_image(self, prompt: str, model: str, size: str, quality: str) -> str:
+        """URL de l'image générée pour `prompt`"""
+        async def request() -> str:
+            with get_telemetry().span("api.openai.images", request_bytes=len(prompt.encode("utf-8"))):
+                response = await self._invoke(self.openai, self.openai.images.generate,
+                                              model=model, prompt=prompt, size=size, quality=quality, n=1)
+            return response.data[0].url
+
+        return await self.openai_images.call(request)
+
+    async def download(self, url: str, path: str) -> str:
+        """Télécharge `url` en flux dans `path` ; un téléchargement échoué ne laisse jamais de fichier tronqué"""
+        async def request() -> None:
+            with get_telemetry().span("http.image_download") as span:
+                if self._is_async(self.http):
+                    async with self.http.stream("GET", url) as response:
+                        response.raise_for_status()
+                        await _save(response.aiter_bytes(DOWNLOAD_CHUNK_SIZE), path, span)
+                    return
+                response = await asyncio.to_thread(self.http.get, url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                with response:
+                    response.raise_for_status()
+                    await _save(_iterate_in_thread(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)),
+                                path, span)
+
+        await self.image_download.call(request)
+        return path
+
+    async def text_to_speech(self, text: str, path: str) -> str:
+        """Écrit en flux la voix de `text` dans `path`, un intervalle de télémétrie par tentative"""
+        async def request() -> None:
+            with get_telemetry().span("api.elevenlabs.tts", request_bytes=len(text.encode("utf-8"))) as span:
+                convert = self.elevenlabs.text_to_speech.convert
+                kwargs = dict(voice_id=self.config.ELEVENLABS_VOICE_ID, text=text,
+                              model_id=self.config.ELEVENLABS_MODEL_ID)
+                if self._is_async(self.elevenlabs):
+                    chunks = convert(**kwargs)
+                else:
+                    chunks = _iterate_in_thread(iter(await asyncio.to_thread(convert, **kwargs)))
+                await _save(chunks, path, span)
+
+        await self.elevenlabs_tts.call(request)
+        return path
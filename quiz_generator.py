@@ -1,13 +1,22 @@
-from openai import OpenAI
-from typing import Dict
+from typing import Callable, Dict, List, Optional
+import logging
 import re
 from models import QuizSection
 from config import Config
+from json_stream import parse_stream
+from manifest import Manifest
+from providers import Providers
+from quiz_schema import QuizIssue, QuizValidationError, format_issues, merge_repair, repair_skeleton, validate_quiz
+from telemetry import get_telemetry
 import json
 
 class QuizGenerator:
-    def __init__(self, config: Config):
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
+    MODEL = "gpt-4"
+
+    def __init__(self, config: Config, providers: Optional[Providers] = None):
+        # Shared by the generators of a run, see providers.py
+        self.providers = providers or Providers(config)
+        self.repair_attempts = config.QUIZ_REPAIR_ATTEMPTS
         self.instruction = """
         Tu es un expert en création de contenu viral pour TikTok, spécialisé dans les quiz éducatifs et divertissants.
 
@@ -33,9 +42,13 @@ class QuizGenerator:
             },
             "appel_abonnement": "call-to-action dynamique",
             "mots_clefs": ["mots clés précis pour la génération d'image"],
-            "prompts_image": {
-                "prompt_1": "description détaillée pour l'image de la question 1",
-                "prompt_2": "description détaillée pour l'image de la question 2"
+            "prompts_image_questions": {
+                "prompt_q1": "description détaillée pour l'image de la question 1",
+                "prompt_q2": "description détaillée pour l'image de la question 2"
+            },
+            "prompts_image_reponses": {
+                "prompt_r1": "description détaillée pour l'image de la réponse 1",
+                "prompt_r2": "description détaillée pour l'image de la réponse 2"
             }
         }
 
@@ -135,7 +148,7 @@ class QuizGenerator:
 """
 
 
-    def generate_quiz(self, quiz_type: str, num_questions: int) -> str:
+    def _messages(self, quiz_type: str, num_questions: int) -> list:
         input_user = self.examples + f"""
         Input:
         type de quizz : {quiz_type}
@@ -143,58 +156,139 @@ class QuizGenerator:
         output:
         """
 
-        completion = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "developer", "content": self.instruction},
-                {"role": "user", "content": input_user}
-            ]
+        return [
+            {"role": "developer", "content": self.instruction},
+            {"role": "user", "content": input_user}
+        ]
+
+    def request_hash(self, quiz_type: str, num_questions: int) -> str:
+        """Hash of everything the completion depends on, to detect an up-to-date quiz"""
+        return Manifest.hash(self.MODEL, self._messages(quiz_type, num_questions))
+
+    def generate_quiz(self, quiz_type: str, num_questions: int) -> str:
+        messages = self._messages(quiz_type, num_questions)
+        return self.providers.run(self.providers.chat(messages, model=self.MODEL))
+
+    def generate_quiz_stream(self, quiz_type: str, num_questions: int,
+                             on_field: Optional[Callable[[tuple, str], None]] = None) -> str:
+        """
+        Stream the completion and report each field as soon as it is complete.
+
+        `on_field(path, value)` is called for every string of the JSON output, e.g.
+        (("questions", "question_1"), "...") or (("prompts_image_reponses", "prompt_r2"), "..."),
+        while the model is still writing the following ones. The full text is
+        returned, so parse_quiz_content gives the same QuizSection as generate_quiz.
+        """
+        messages = self._messages(quiz_type, num_questions)
+        chunks = self.providers.iterate(self.providers.chat_stream(messages, model=self.MODEL))
+        return parse_stream(chunks, on_field)
+
+    def create_quiz(self, quiz_type: str, num_questions: int,
+                    on_field: Optional[Callable[[tuple, str], None]] = None) -> QuizSection:
+        """
+        Generate the quiz, check every field and repair only the invalid ones.
+
+        A completion with missing or malformed fields (see quiz_schema.py) is not
+        thrown away: a short repair request asks for those fields alone, at most
+        QUIZ_REPAIR_ATTEMPTS times. Raises QuizValidationError if some are still
+        invalid after that.
+        """
+        num_questions = int(num_questions)
+        if on_field is not None:
+            text = self.generate_quiz_stream(quiz_type, num_questions, on_field)
+        else:
+            text = self.generate_quiz(quiz_type, num_questions)
+        content = self.load_content(text)
+
+        issues = validate_quiz(content, num_questions)
+        for attempt in range(self.repair_attempts):
+            if not any(issue.repairable for issue in issues):
+                break
+            logging.warning(f"Quiz content has {len(issues)} invalid fields, repair {attempt + 1}:\n"
+                            f"{format_issues(issues)}")
+            content = merge_repair(content, self.repair_quiz(quiz_type, content, issues), issues)
+            issues = validate_quiz(content, num_questions)
+
+        # Left after the repairs: only unexpected fields can still be dropped
+        if any(issue.repairable for issue in issues):
+            raise QuizValidationError(issues)
+        return self.to_section(merge_repair(content, {}, issues))
+
+    def repair_quiz(self, quiz_type: str, content: dict, issues: List[QuizIssue]) -> dict:
+        """Ask for the fields of `issues` only, with the rest of the quiz as context"""
+        skeleton = repair_skeleton(issues)
+        messages = [
+            {"role": "developer", "content": self.instruction},
+            {"role": "user", "content": f"""
+        Voici un quiz de type {quiz_type} déjà généré :
+        {json.dumps(content, ensure_ascii=False, indent=4)}
+
+        Ces champs sont manquants ou invalides :
+        {format_issues(issues)}
+
+        Renvoie uniquement cet objet JSON, chaque champ rempli en restant cohérent avec le reste du quiz :
+        {json.dumps(skeleton, ensure_ascii=False, indent=4)}
+        """}
+        ]
+        with get_telemetry().span("quiz.repair", fields=sum(issue.repairable for issue in issues)):
+            text = self.providers.run(self.providers.chat(messages, model=self.MODEL))
+        return self.load_content(text)
+
+    @staticmethod
+    def to_section(content: dict) -> QuizSection:
+        return QuizSection(
+            introduction=content.get('introduction', ''),
+            questions=content.get('questions', {}),
+            reponses=content.get('reponses', {}),
+            appel_abonnement=content.get('appel_abonnement', ''),
+            mots_clefs=content.get('mots_clefs', []),
+            prompts_image_questions=content.get('prompts_image_questions', {}),
+            prompts_image_reponses=content.get('prompts_image_reponses', {})
         )
-        return completion.choices[0].message.content
 
     def parse_quiz_content(self, text: str) -> QuizSection:
+        """QuizSection of a completion as is, without validation (see create_quiz)"""
+        return self.to_section(self.load_content(text))
+
+    def load_content(self, text: str) -> dict:
+        """
+        Quiz dict of a completion. Text around the JSON object (e.g. a markdown
+        fence) is ignored; a completion that is not JSON at all is read with the
+        legacy "Question_1 : ..." format, which has no image prompts.
+        """
         try:
-            # Parse the JSON content directly
-            content = json.loads(text)
-            
-            return QuizSection(
-                introduction=content.get('introduction', ''),
-                questions=content.get('questions', {}),
-                reponses=content.get('reponses', {}),
-                appel_abonnement=content.get('appel_abonnement', ''),
-                mots_clefs=content.get('mots_clefs', []),
-                prompts_image_questions=content.get('prompts_image_questions', {}),
-                prompts_image_reponses=content.get('prompts_image_reponses', {})
-            )
-        except json.JSONDecodeError:
-            # Fallback to regex parsing if content is not valid JSON
-            intro_match = re.search(r"Introduction : (.+?)(?=\n)", text, re.DOTALL)
-            introduction = intro_match.group(1).strip() if intro_match else ""
-
-            questions = {}
-            for match in re.finditer(r"Question_(\d+) : (.+?)(?=\n)", text):
-                questions[f"question_{match.group(1)}"] = match.group(2).strip()
-
-            reponses = {}
-            for match in re.finditer(r"Réponse_(\d+) : (.+?)(?=\n)", text):
-                reponses[f"reponse_{match.group(1)}"] = match.group(2).strip()
-
-            appel_match = re.search(r"Appel_abonnement : (.+?)(?=\n)", text)
-            appel_abonnement = appel_match.group(1).strip() if appel_match else ""
-
-            mots_clefs_match = re.search(r"Mots_clefs : (.+?)(?=\n|$)", text)
-            mots_clefs = [mot.strip() for mot in mots_clefs_match.group(1).split(',')] if mots_clefs_match else []
-
-            # Default empty dict for prompts_image in legacy format
-            prompts_image_questions = {}
-            prompts_image_reponses = {}
-
-            return QuizSection(
-                introduction=introduction,
-                questions=questions,
-                reponses=reponses,
-                appel_abonnement=appel_abonnement,
-                mots_clefs=mots_clefs,
-                prompts_image_questions=prompts_image_questions,
-                prompts_image_reponses=prompts_image_reponses
-            )
+            content = json.loads(text[text.index("{"):text.rindex("}") + 1])
+            if isinstance(content, dict):
+                return content
+        except ValueError:
+            pass
+
+        logging.warning("Quiz completion is not JSON, falling back to the legacy text format")
+        # Fallback to regex parsing if content is not valid JSON
+        intro_match = re.search(r"Introduction : (.+?)(?=\n)", text, re.DOTALL)
+        introduction = intro_match.group(1).strip() if intro_match else ""
+
+        questions = {}
+        for match in re.finditer(r"Question_(\d+) : (.+?)(?=\n)", text):
+            questions[f"question_{match.group(1)}"] = match.group(2).strip()
+
+        reponses = {}
+        for match in re.finditer(r"Réponse_(\d+) : (.+?)(?=\n)", text):
+            reponses[f"reponse_{match.group(1)}"] = match.group(2).strip()
+
+        appel_match = re.search(r"Appel_abonnement : (.+?)(?=\n)", text)
+        appel_abonnement = appel_match.group(1).strip() if appel_match else ""
+
+        mots_clefs_match = re.search(r"Mots_clefs : (.+?)(?=\n|$)", text)
+        mots_clefs = [mot.strip() for mot in mots_clefs_match.group(1).split(',')] if mots_clefs_match else []
+
+        # No image prompts in the legacy format: create_quiz repairs them
+        return {
+            'introduction': introduction,
+            'questions': questions,
+            'reponses': reponses,
+            'appel_abonnement': appel_abonnement,
+            'mots_clefs': mots_clefs,
+            'prompts_image_questions': {},
+            'prompts_image_reponses': {}
+        }
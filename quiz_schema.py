@@ -0,0 +1,151 @@
+"""
+Validation champ par champ du JSON de quiz renvoyé par GPT-4.
+
+Un quiz de N questions a besoin d'une introduction, d'un appel à l'abonnement et
+de N entrées dans chaque section numérotée (question_1..N, reponse_1..N,
+prompt_q1..N, prompt_r1..N), chacune une chaîne non vide. `validate_quiz` liste
+ce qui manque ou est mal formé sous forme de chemins QuizIssue, `format_issues`
+en fait un diff compact pour les journaux et la demande de réparation, et
+`merge_repair` ne reprend que ces chemins de la complétion réparée : les champs
+valides ne sont jamais régénérés.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import copy
+
+TEXT_FIELDS = ("introduction", "appel_abonnement")
+NUMBERED_SECTIONS = {
+    "questions": "question_",
+    "reponses": "reponse_",
+    "prompts_image_questions": "prompt_q",
+    "prompts_image_reponses": "prompt_r",
+}
+
+MISSING = "missing"
+EMPTY = "empty"
+NOT_TEXT = "not a string"
+UNEXPECTED = "unexpected"
+
+
+@dataclass(frozen=True)
+class QuizIssue:
+    """Problème d'un champ, ex. (("questions", "question_4"), "missing")"""
+    path: tuple
+    problem: str
+
+    @property
+    def repairable(self) -> bool:
+        # Les champs inattendus sont retirés, les autres ont besoin d'une nouvelle valeur
+        return self.problem != UNEXPECTED
+
+    def __str__(self) -> str:
+        return f"{'.'.join(self.path)}: {self.problem}"
+
+
+class QuizValidationError(ValueError):
+    def __init__(self, issues: List[QuizIssue]):
+        super().__init__("Invalid quiz content:\n" + format_issues(issues))
+        self.issues = issues
+
+
+def expected_keys(num_questions: int) -> Dict[str, List[str]]:
+    """Clés de chaque section numérotée pour un quiz de `num_questions` questions"""
+    return {
+        section: [f"{prefix}{num}" for num in range(1, num_questions + 1)]
+        for section, prefix in NUMBERED_SECTIONS.items()
+    }
+
+
+def _check_text(path: tuple, value) -> Optional[QuizIssue]:
+    if value is None:
+        return QuizIssue(path, MISSING)
+    if not isinstance(value, str):
+        return QuizIssue(path, NOT_TEXT)
+    if not value.strip():
+        return QuizIssue(path, EMPTY)
+    return None
+
+
+def validate_quiz(content: dict, num_questions: int) -> List[QuizIssue]:
+    """Chaque champ manquant, vide, non textuel ou inattendu du quiz, dans l'ordre de sortie"""
+    issues = []
+    for field in TEXT_FIELDS:
+        issue = _check_text((field,), content.get(field))
+        if issue is not None:
+            issues.append(issue)
+
+    for section, keys in expected_keys(num_questions).items():
+        values = content.get(section)
+        if not isinstance(values, dict):
+            values = {}
+        for key in keys:
+            issue = _check_text((section, key), values.get(key))
+            if issue is not None:
+                issues.append(issue)
+        issues.extend(QuizIssue((section, key), UNEXPECTED) for key in values if key not in keys)
+
+    # Ne sert que de contexte aux prompts : une mauvaise valeur est retirée plutôt que réparée
+    mots_clefs = content.get("mots_clefs", [])
+    if not isinstance(mots_clefs, list) or not all(isinstance(mot, str) for mot in mots_clefs):
+        issues.append(QuizIssue(("mots_clefs",), UNEXPECTED))
+    return issues
+
+
+def format_issues(issues: List[QuizIssue]) -> str:
+    """
+    Diff compact des problèmes, une ligne par section et par problème, ex.
+    "prompts_image_questions.{prompt_q2, prompt_q5}: missing".
+    """
+    groups: Dict[tuple, List[str]] = {}
+    for issue in issues:
+        if len(issue.path) == 1:
+            groups.setdefault((issue.path[0], issue.problem), [])
+        else:
+            groups.setdefault((issue.path[0], issue.problem), []).append(issue.path[1])
+
+    lines = []
+    for (field, problem), keys in groups.items():
+        if not keys:
+            lines.append(f"- {field}: {problem}")
+        elif len(keys) == 1:
+            lines.append(f"- {field}.{keys[0]}: {problem}")
+        else:
+            lines.append(f"- {field}.{{{', '.join(keys)}}}: {problem}")
+    return "\n".join(lines)
+
+
+def repair_skeleton(issues: List[QuizIssue]) -> dict:
+    """Objet JSON avec les champs à régénérer, chacun à une chaîne vide"""
+    skeleton = {}
+    for issue in issues:
+        if not issue.repairable:
+            continue
+        if len(issue.path) == 1:
+            skeleton[issue.path[0]] = ""
+        else:
+            skeleton.setdefault(issue.path[0], {})[issue.path[1]] = ""
+    return skeleton
+
+
+def merge_repair(content: dict, repaired: dict, issues: List[QuizIssue]) -> dict:
+    """Copie de `content` avec les champs de `issues` repris de `repaired`, les inattendus retirés"""
+    merged = copy.deepcopy(content)
+    for issue in issues:
+        field = issue.path[0]
+        if not issue.repairable:
+            if len(issue.path) == 1:
+                merged.pop(field, None)
+            else:
+                merged.get(field, {}).pop(issue.path[1], None)
+            continue
+
+        if len(issue.path) == 1:
+            if field in repaired:
+                merged[field] = repaired[field]
+            continue
+        section = repaired.get(field)
+        if isinstance(section, dict) and issue.path[1] in section:
+            if not isinstance(merged.get(field), dict):
+                merged[field] = {}
+            merged[field][issue.path[1]] = section[issue.path[1]]
+    return merged
@@ -0,0 +1,74 @@
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+import hashlib
+import os
+
+from media_cache import MediaCache
+
+# À incrémenter quand le code de rendu change les pixels d'un segment
+RENDER_VERSION = 3
+
+
+@lru_cache(maxsize=1024)
+def _digest(path: str, mtime_ns: int, size: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """Empreinte du contenu d'un fichier, ou de son chemin s'il n'existe pas encore"""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return f"missing:{path}"
+    return _digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+class SegmentCache:
+    """
+    Segments vidéo encodés des rendus précédents, partagés par tous les runs.
+
+    Un segment est indexé par ce qui change ses pixels : le contenu de ses images,
+    l'effet, le ratio et le nombre de frames de chaque plan, la taille de sortie,
+    le profil d'encodage et le rendu rapide des plans fixes. Les voix n'entrent que
+    par le nombre de frames, la bande son étant multiplexée à part : reformuler une
+    réponse sans changer sa durée réutilise le segment encodé.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.cache = MediaCache(root, max_bytes, extension=".mp4")
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, segment, size: Tuple[int, int], profile, static_fast_path: bool,
+            master_size: Optional[Tuple[int, int]] = None, digest: Callable[[str], str] = file_digest) -> str:
+        """`digest` donne l'empreinte du contenu d'une image, ex. MediaIndex.digest pour éviter de la relire"""
+        parts = [
+            RENDER_VERSION,
+            list(size),
+            # Le nombre de threads dépend du nombre de processus de rendu, pas de la vidéo
+            {name: value for name, value in asdict(profile).items() if name != "threads"},
+            static_fast_path,
+            [[digest(spec.image), spec.effect, spec.ratio, spec.frames, spec.caption] for spec in segment.clips],
+        ]
+        if master_size is not None and tuple(master_size) != tuple(size):
+            # Recadré et mis à l'échelle depuis des frames rendues à une autre taille (voir fanout.py)
+            parts.append(list(master_size))
+        return self.cache.key(*parts)
+
+    def fetch(self, key: str, destination: str) -> bool:
+        """Place le segment en cache à `destination`, False s'il faut l'encoder"""
+        found = self.cache.link_into(key, destination)
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def store(self, key: str, path: str) -> None:
+        self.cache.add(key, path)
@@ -0,0 +1,246 @@
+"""
+Service résident qui garde chaudes les parties coûteuses d'un run entre deux tâches de quiz.
+
+Usage: py service.py [--host 127.0.0.1] [--port 8765]
+
+Les clients d'API avec leurs pools de connexions et leur boucle d'événements
+(providers.py), les processus de rendu et les médias décodés de static_media sont
+créés une fois au démarrage, au lieu de chaque lancement de main.py. Les tâches
+passent par le pipeline de batch.py et se pilotent par une API HTTP locale :
+
+    POST /jobs                 {"quiz_type": "Science", "num_questions": 6, "auto_approve": false,
+                                "output_dir": "./video_data/01-18-25"}
+    GET  /jobs                 toutes les tâches du service
+    GET  /jobs/<id>            statut, dossier de sortie, content.json, brouillon et vidéo
+    POST /jobs/<id>/approve    génère les médias et la vidéo d'une tâche en attente de validation
+    POST /jobs/<id>/reject     abandonne une tâche en attente de validation
+    GET  /health
+
+Statuts : pending, text, awaiting_approval, media, montage, done, failed, rejected.
+main.py est un client de cette API (voir service_client.py) quand le service tourne :
+il passe le dossier de run du jour, comme le chemin direct, pour qu'une relance
+reprenne le quiz et les médias enregistrés. Sans output_dir, une tâche a son propre
+dossier. Seules les SERVICE_KEPT_JOBS dernières tâches terminées sont gardées.
+"""
+from concurrent.futures import ProcessPoolExecutor, wait
+from dataclasses import asdict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from batch import QUIZ_TYPES, BatchJob, BatchRunner, JobResult
+from config import Config
+from fanout import master_size
+from montage import DRAFT_SIZE, preload_static_media
+from providers import Providers
+
+
+FINISHED = ("done", "failed", "rejected")
+
+
+class QuizService:
+    def __init__(self, config: Config, providers: Optional[Providers] = None, render_workers: Optional[int] = None):
+        self.config = config
+        self.started = time.time()
+        sizes = (master_size([(config.OUTPUT_WIDTH, config.OUTPUT_HEIGHT)] + list(config.EXTRA_OUTPUT_SIZES)),
+                 DRAFT_SIZE)
+        # Les plans fixes et les rendus sans pool décodent static_media dans ce processus
+        preload_static_media(sizes)
+        render_workers = render_workers or config.RENDER_WORKERS
+        self.render_pool = None
+        if render_workers > 1:
+            self.render_pool = ProcessPoolExecutor(
+                max_workers=render_workers, initializer=preload_static_media, initargs=(sizes,)
+            )
+            # Démarre les processus maintenant : un fork une fois les threads des tâches et HTTP lancés pourrait copier un verrou tenu
+            wait([self.render_pool.submit(os.getpid) for _ in range(render_workers)])
+        # Une seule boucle d'événements et un seul jeu de pools de connexions pour les appels d'API de toutes les tâches
+        self.providers = providers or Providers(config)
+        self.providers.warm_up()
+        self.runner = BatchRunner(
+            config, config.BATCH_TEXT_WORKERS, config.BATCH_MEDIA_WORKERS, config.BATCH_MONTAGE_WORKERS,
+            providers=self.providers, render_pool=self.render_pool,
+        )
+        self.jobs: Dict[str, JobResult] = {}
+        self.lock = threading.Lock()
+
+    def _evict_finished(self) -> None:
+        """Oublie les tâches terminées les plus anciennes au-delà de SERVICE_KEPT_JOBS (appelé avec le verrou tenu)"""
+        finished = [job_id for job_id, result in self.jobs.items() if result.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.config.SERVICE_KEPT_JOBS)]:
+            del self.jobs[job_id]
+
+    def submit(self, job: BatchJob, output_dir: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        if output_dir is None:
+            output_dir = Path(self.config.RUN_DIR) / f"{datetime.now().strftime('%H%M%S')}_{job_id}"
+        with self.lock:
+            # Deux tâches écrivant le même dossier de run partageraient son manifeste. Un quiz laissé
+            # en attente de validation (main.py fermé avant la réponse) est remplacé par la relance.
+            for result in self.jobs.values():
+                if result.status in FINISHED or Path(result.output_dir).resolve() != Path(output_dir).resolve():
+                    continue
+                if result.status != "awaiting_approval":
+                    raise ValueError(f"A job is already running in {output_dir}")
+                result.status = "rejected"
+            self._evict_finished()
+            self.jobs[job_id], _ = self.runner.submit(job, output_dir)
+        logging.info(f"Service job {job_id} queued in {output_dir}")
+        return job_id
+
+    def approve(self, job_id: str) -> None:
+        with self.lock:
+            result = self.jobs[job_id]
+            if result.status != "awaiting_approval":
+                raise ValueError(f"Job {job_id} is {result.status}, not awaiting approval")
+            self.runner.submit_approved(result)
+        logging.info(f"Service job {job_id} approved")
+
+    def reject(self, job_id: str) -> None:
+        with self.lock:
+            result = self.jobs[job_id]
+            if result.status != "awaiting_approval":
+                raise ValueError(f"Job {job_id} is {result.status}, not awaiting approval")
+            result.status = "rejected"
+        logging.info(f"Service job {job_id} rejected")
+
+    def describe(self, job_id: str) -> Optional[dict]:
+        """État d'une tâche, None si le service ne la connaît pas ou l'a déjà oubliée"""
+        with self.lock:
+            result = self.jobs.get(job_id)
+            if result is None:
+                return None
+            job = asdict(result)
+        output_dir = Path(job["output_dir"])
+        content = output_dir / "text" / "content.json"
+        draft = output_dir / "draft_preview.mp4"
+        return {
+            "id": job_id,
+            **job,
+            "content": str(content) if content.exists() else None,
+            "draft": str(draft) if draft.exists() else None,
+        }
+
+    def list_jobs(self) -> List[dict]:
+        with self.lock:
+            job_ids = list(self.jobs)
+        # Une tâche oubliée entre-temps n'est pas listée
+        return [job for job in map(self.describe, job_ids) if job is not None]
+
+    def health(self) -> dict:
+        with self.lock:
+            statuses = [result.status for result in self.jobs.values()]
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "render_workers": self.render_pool._max_workers if self.render_pool else 1,
+            "jobs": {status: statuses.count(status) for status in sorted(set(statuses))},
+        }
+
+    def shutdown(self) -> None:
+        self.runner.shutdown()
+        self.providers.close()
+        if self.render_pool is not None:
+            self.render_pool.shutdown(wait=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service: QuizService = None
+
+    def _send(self, status: int, body) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_job(self, status: int, job_id: str) -> None:
+        job = self.service.describe(job_id)
+        if job is None:
+            self._send(404, {"error": "not found"})
+        else:
+            self._send(status, job)
+
+    def _parts(self):
+        return [part for part in self.path.split("?")[0].split("/") if part]
+
+    def do_GET(self):
+        parts = self._parts()
+        if parts == ["health"]:
+            self._send(200, self.service.health())
+        elif parts == ["jobs"]:
+            self._send(200, self.service.list_jobs())
+        elif len(parts) == 2 and parts[0] == "jobs":
+            self._send_job(200, parts[1])
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = self._parts()
+        try:
+            if parts == ["jobs"]:
+                length = int(self.headers.get("Content-Length", 0))
+                entry = json.loads(self.rfile.read(length) or b"{}")
+                job = BatchJob(
+                    quiz_type=entry.get("quiz_type", ""),
+                    num_questions=int(entry.get("num_questions", 0)),
+                    auto_approve=bool(entry.get("auto_approve", False)),
+                )
+                if job.quiz_type not in QUIZ_TYPES or job.num_questions < 1:
+                    raise ValueError(f"quiz_type must be one of {QUIZ_TYPES} and num_questions a positive number")
+                self._send_job(202, self.service.submit(job, entry.get("output_dir")))
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] in ("approve", "reject"):
+                if parts[2] == "approve":
+                    self.service.approve(parts[1])
+                else:
+                    self.service.reject(parts[1])
+                self._send_job(202, parts[1])
+            else:
+                self._send(404, {"error": "not found"})
+        except KeyError:
+            # Tâche inconnue ou déjà oubliée (voir _evict_finished)
+            self._send(404, {"error": "not found"})
+        except ValueError as e:
+            self._send(409 if len(parts) == 3 else 400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        logging.info(f"Service request: {format % args}")
+
+
+def serve(service: QuizService, host: str, port: int) -> ThreadingHTTPServer:
+    handler = type("Handler", (ServiceHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description="Service de génération de quiz")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    args = parser.parse_args()
+
+    service = QuizService(config)
+    server = serve(service, args.host, args.port)
+    print(f"Service prêt sur http://{args.host}:{args.port} (Ctrl+C pour arrêter)")
+    logging.info(f"Service listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Client du service local (service.py), uniquement avec la bibliothèque standard pour démarrer instantanément"""
+from typing import Iterable, Optional
+import json
+import time
+import urllib.error
+import urllib.request
+
+
+class ServiceClient:
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read() or b"{}").get("error", str(e))) from e
+
+    def is_available(self) -> bool:
+        try:
+            return self._request("GET", "/health").get("status") == "ok"
+        except (OSError, ValueError):
+            return False
+
+    def submit(self, quiz_type: str, num_questions: int, auto_approve: bool = False,
+               output_dir: Optional[str] = None) -> dict:
+        body = {"quiz_type": quiz_type, "num_questions": num_questions, "auto_approve": auto_approve}
+        if output_dir is not None:
+            body["output_dir"] = output_dir
+        return self._request("POST", "/jobs", body)
+
+    def status(self, job_id: str) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def approve(self, job_id: str) -> dict:
+        return self._request("POST", f"/jobs/{job_id}/approve")
+
+    def reject(self, job_id: str) -> dict:
+        return self._request("POST", f"/jobs/{job_id}/reject")
+
+    def wait(self, job_id: str, statuses: Iterable[str], interval: float = 0.5) -> dict:
+        """Interroge la tâche jusqu'à ce qu'elle atteigne l'un des `statuses`, ou échoue"""
+        statuses = set(statuses) | {"failed"}
+        while True:
+            job = self.status(job_id)
+            if job["status"] in statuses:
+                return job
+            time.sleep(interval)
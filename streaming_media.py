@@ -0,0 +1,124 @@
+from concurrent.futures import Future
+from typing import Coroutine, Dict, Optional, Tuple
+import asyncio
+import logging
+from models import QuizSection
+from image_generator import ImageGenerator
+from voice_generator import VoiceGenerator
+
+IMAGE_SECTIONS = {
+    'prompts_image_questions': 'questions',
+    'prompts_image_reponses': 'answers',
+}
+
+
+def voice_filename(path: tuple) -> Optional[str]:
+    """Fichier voix lu pour un champ du quiz, ex. ("questions", "question_3") -> "Question_3.mp3"."""
+    if path == ('introduction',):
+        return 'Introduction.mp3'
+    if path == ('appel_abonnement',):
+        return 'Appel.mp3'
+    if len(path) == 2 and path[0] == 'questions' and str(path[1]).startswith('question_'):
+        return f"Question_{path[1].split('_')[1]}.mp3"
+    if len(path) == 2 and path[0] == 'reponses' and str(path[1]).startswith('reponse_'):
+        return f"Reponse_{path[1].split('_')[1]}.mp3"
+    return None
+
+
+class StreamingMediaScheduler:
+    """
+    Lance la génération des voix et des images pendant que le quiz arrive en flux.
+
+    Passer `on_field` à QuizGenerator.generate_quiz_stream : chaque question,
+    réponse, introduction, appel à l'abonnement et prompt d'image terminé est
+    soumis aussitôt. `finish` attend ensuite ces tâches, génère ce que le flux n'a
+    pas livré et renvoie le même dictionnaire image_paths que generate_images.
+
+    Les tâches tournent sur la boucle d'événements des providers des générateurs,
+    dans les limites de chaque API.
+    """
+
+    def __init__(self, image_gen: ImageGenerator, voice_gen: VoiceGenerator):
+        self.image_gen = image_gen
+        self.voice_gen = voice_gen
+        self.providers = image_gen.providers
+        self.voice_jobs: Dict[str, Tuple[str, Future]] = {}
+        self.image_jobs: Dict[Tuple[str, str], Tuple[str, Future]] = {}
+
+    def on_field(self, path: tuple, value: str) -> None:
+        filename = voice_filename(path)
+        if filename is not None:
+            self._submit_voice(filename, value)
+        elif len(path) == 2 and path[0] in IMAGE_SECTIONS:
+            self._submit_image(IMAGE_SECTIONS[path[0]], path[1], value)
+
+    def _submit_after(self, previous: Optional[Future], coro: Coroutine) -> Future:
+        """
+        Planifie `coro` une fois terminée la tâche qu'elle remplace (même fichier de
+        sortie, ancienne valeur) : les deux n'écrivent jamais le fichier en même temps
+        et c'est la nouvelle valeur qui reste sur le disque.
+        """
+        if previous is None:
+            return self.providers.submit(coro)
+
+        async def after_previous():
+            try:
+                await asyncio.wrap_future(previous)
+            except asyncio.CancelledError:
+                if not previous.cancelled():
+                    coro.close()
+                    raise
+            except Exception:
+                # L'erreur concerne la valeur remplacée
+                pass
+            return await coro
+
+        return self.providers.submit(after_previous())
+
+    def _submit_voice(self, filename: str, text: str) -> None:
+        previous = self.voice_jobs.get(filename, (None, None))[1]
+        self.voice_jobs[filename] = (
+            text, self._submit_after(previous, self.voice_gen.create_voice_async(text, filename))
+        )
+
+    def _submit_image(self, section: str, key: str, prompt: str) -> None:
+        previous = self.image_jobs.get((section, key), (None, None))[1]
+        self.image_jobs[(section, key)] = (
+            prompt, self._submit_after(previous, self.image_gen.generate_image_async(key, prompt))
+        )
+
+    def cancel(self) -> None:
+        """Abandonne les tâches (quiz refusé) ; un téléchargement interrompu ne laisse aucun fichier."""
+        for _, future in list(self.voice_jobs.values()) + list(self.image_jobs.values()):
+            future.cancel()
+
+    def finish(self, quiz: QuizSection) -> Dict[str, Dict[str, str]]:
+        """Complète les médias du quiz final et renvoie les chemins des images."""
+        self.image_gen.prune_stale(quiz)
+        self.voice_gen.prune_stale(quiz)
+        for filename, text in self.voice_gen.voice_parts(quiz).items():
+            if self.voice_jobs.get(filename, (None,))[0] != text:
+                self._submit_voice(filename, text)
+
+        prompts = (
+            [('questions', key, prompt) for key, prompt in quiz.prompts_image_questions.items()]
+            + [('answers', key, prompt) for key, prompt in quiz.prompts_image_reponses.items()]
+        )
+        for section, key, prompt in prompts:
+            if self.image_jobs.get((section, key), (None,))[0] != prompt:
+                self._submit_image(section, key, prompt)
+
+        for filename, (_, future) in self.voice_jobs.items():
+            future.result()
+
+        image_paths = {'questions': {}, 'answers': {}}
+        for section, key, _ in prompts:
+            try:
+                image_paths[section][key] = str(self.image_jobs[(section, key)][1].result())
+            except Exception as e:
+                label = 'question' if section == 'questions' else 'answer'
+                print(f"Error generating {label} image for {key}: {str(e)}")
+                continue
+
+        logging.info(f"Streamed media: {len(self.voice_jobs)} voices, {len(self.image_jobs)} images")
+        return image_paths
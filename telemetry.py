@@ -0,0 +1,185 @@
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from atomic_file import write_text_atomic
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _windows_peak_rss() -> Optional[int]:
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """
+    Pic de mémoire résidente de ce processus, ou de ses processus enfants terminés
+    (processus de rendu, ffmpeg) si `children` est True. None si indisponible.
+    """
+    if resource is None:
+        return None if children else _windows_peak_rss()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss est en octets sous macOS et en kilo-octets ailleurs
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class Telemetry:
+    """
+    Intervalles chronométrés des étapes et des appels d'API d'un run.
+
+    Entourer le travail de `with telemetry.span("api.openai.chat", request_bytes=...) as span:`
+    et ajouter ce qui n'est connu qu'à la fin, ex. `span["response_bytes"] = size`. Les
+    intervalles sont thread-safe : les pools d'images et de voix enregistrent dans la
+    même instance. Les mesures prises ailleurs (processus de rendu) s'ajoutent avec `record`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans: List[dict] = []
+            self.started = time.time()
+            self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._add(name, start, time.perf_counter() - start, attributes, error)
+
+    def record(self, name: str, duration: float, **attributes) -> None:
+        """Ajoute un intervalle mesuré hors de `span`, qui se termine maintenant"""
+        self._add(name, time.perf_counter() - duration, duration, attributes, None)
+
+    def _add(self, name: str, start: float, duration: float, attributes: dict, error: Optional[str]) -> None:
+        entry = {
+            "name": name,
+            "start": round(start - self._origin, 4),
+            "seconds": round(duration, 4),
+            "thread": threading.current_thread().name,
+            **attributes,
+        }
+        if error is not None:
+            entry["error"] = error
+        with self._lock:
+            self._spans.append(entry)
+        logging.debug(f"Span {name}: {duration:.3f}s {attributes}" + (f" ({error})" if error else ""))
+
+    def spans(self, name: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            return [dict(span) for span in self._spans if name is None or span["name"] == name]
+
+    def summary(self) -> Dict[str, dict]:
+        """Nombre, durée totale et maximale, erreurs et octets cumulés par nom d'intervalle"""
+        summary = {}
+        for span in self.spans():
+            entry = summary.setdefault(span["name"], {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["seconds"] += span["seconds"]
+            entry["max_seconds"] = max(entry["max_seconds"], span["seconds"])
+            entry["errors"] += "error" in span
+            for key, value in span.items():
+                if key.endswith("_bytes") or key == "frames":
+                    entry[key] = entry.get(key, 0) + value
+        for entry in summary.values():
+            entry["seconds"] = round(entry["seconds"], 4)
+        return summary
+
+    def report(self) -> dict:
+        summary = self.summary()
+        render = summary.get("montage.render", {})
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(time.perf_counter() - self._origin, 3),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "peak_children_rss_bytes": peak_rss_bytes(children=True),
+            "render_fps": round(render["frames"] / render["seconds"], 2) if render.get("seconds") else None,
+            "summary": summary,
+            "spans": self.spans(),
+        }
+
+    def write_report(self, path) -> dict:
+        """Écrit le rapport du run en JSON et le renvoie"""
+        report = self.report()
+        write_text_atomic(path, json.dumps(report, ensure_ascii=False, indent=4))
+        logging.info(f"Run report written to {path}")
+        return report
+
+    def write_prometheus(self, path) -> None:
+        """Écrit le résumé au format textfile de Prometheus (collecteur textfile de node_exporter)"""
+        report = self.report()
+        lines = [
+            "# HELP quiz_span_seconds_total Time spent in each stage or API call.",
+            "# TYPE quiz_span_seconds_total counter",
+        ]
+        lines += [f'quiz_span_seconds_total{{span="{name}"}} {entry["seconds"]}'
+                  for name, entry in report["summary"].items()]
+        lines += ["# HELP quiz_span_count_total Number of spans of each kind.",
+                  "# TYPE quiz_span_count_total counter"]
+        lines += [f'quiz_span_count_total{{span="{name}"}} {entry["count"]}'
+                  for name, entry in report["summary"].items()]
+        lines += ["# HELP quiz_span_errors_total Number of failed spans of each kind.",
+                  "# TYPE quiz_span_errors_total counter"]
+        lines += [f'quiz_span_errors_total{{span="{name}"}} {entry["errors"]}'
+                  for name, entry in report["summary"].items()]
+        lines += ["# HELP quiz_span_bytes_total Payload bytes sent and received by each kind of span.",
+                  "# TYPE quiz_span_bytes_total counter"]
+        lines += [f'quiz_span_bytes_total{{span="{name}",direction="{key[:-len("_bytes")]}"}} {value}'
+                  for name, entry in report["summary"].items()
+                  for key, value in entry.items() if key.endswith("_bytes")]
+        for metric, value, help_text in [
+            ("quiz_run_wall_seconds", report["wall_seconds"], "Wall-clock duration of the run."),
+            ("quiz_render_fps", report["render_fps"], "Frames rendered per second by the montage."),
+            ("quiz_peak_rss_bytes", report["peak_rss_bytes"], "Peak resident memory of the process."),
+            ("quiz_peak_children_rss_bytes", report["peak_children_rss_bytes"],
+             "Peak resident memory of the render processes and encoders."),
+        ]:
+            if value is not None:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge", f"{metric} {value}"]
+        # Le collecteur textfile peut lire à tout moment : jamais de fichier partiel
+        write_text_atomic(path, "\n".join(lines) + "\n")
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    """Télémétrie partagée par toutes les étapes du processus"""
+    return _telemetry
@@ -0,0 +1,47 @@
+"""
+Brouillon avec des champs courts : leur voix substituée dure exactement la durée
+minimale d'un plan. À lancer depuis la racine du dépôt : py -m pytest tests
+"""
+import numpy as np
+from moviepy import VideoFileClip
+
+from config import DRAFT_PROFILE
+from montage import (ClipSpec, Segment, create_educational_video, prepare_draft_assets, quantize_segments,
+                     soundtrack_for)
+
+SHORT_TEXTS = {
+    "Introduction.mp3": "Salut !",
+    "Question_1.mp3": "Oui ?",
+    "Reponse_1.mp3": "Non.",
+    "Appel.mp3": "Abonnez-vous",
+}
+
+
+def test_missing_voice_becomes_silent_shot(tmp_path):
+    spec = ClipSpec(image=str(tmp_path / "images" / "q1.png"), audio=str(tmp_path / "voices" / "Question_1.mp3"))
+    segments = prepare_draft_assets([Segment("question_1", [spec])], SHORT_TEXTS, str(tmp_path))
+    quantize_segments(segments, fps=24)
+
+    assert spec.audio == ""
+    assert spec.duration == 1.0
+    assert spec.frames == 24
+    track = np.concatenate(list(soundtrack_for(segments, fps=24)))
+    assert track.shape == (44100, 2)
+    assert not track.any()
+
+
+def test_draft_renders_short_fields(tmp_path):
+    (tmp_path / "images").mkdir()
+    (tmp_path / "voices").mkdir()
+    output_file = tmp_path / "draft.mp4"
+
+    create_educational_video(str(tmp_path / "images"), str(tmp_path / "voices"), str(output_file),
+                             draft=True, texts=SHORT_TEXTS, num_questions=1)
+
+    # Intro, appel, question et réponse à 1 s chacun, pause de 3 s
+    clip = VideoFileClip(str(output_file))
+    try:
+        assert clip.audio is not None
+        assert abs(clip.duration - 7.0) <= 2 / DRAFT_PROFILE.fps
+    finally:
+        clip.close()
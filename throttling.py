@@ -0,0 +1,99 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Seau à jetons thread-safe.
+
+    Autorise `rate_per_minute` appels par minute en moyenne avec des rafales d'au
+    plus `burst` appels ; `acquire_async` attend un jeton sans bloquer la boucle
+    d'événements.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(max(1, burst or 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take(self) -> float:
+        """Prend un jeton, ou renvoie le temps d'attente avant le suivant"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire_async(self) -> None:
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, rate_per_minute: float, burst: Optional[int] = None) -> RateLimiter:
+    """Renvoie le limiteur du processus pour un provider, partagé par tous les clients qui l'utilisent."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(rate_per_minute, burst)
+        return _limiters[provider]
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """True pour les limitations de débit et les erreurs serveur passagères des SDK OpenAI/ElevenLabs
+    et de requests, et pour les requêtes coupées par leur délai."""
+    if isinstance(exc, TimeoutError):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, "response", None), "status_code", None)
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def _backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+async def retry_with_backoff_async(
+    func: Callable[[], Awaitable[T]],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    is_retryable: Callable[[Exception], bool] = is_retryable_error,
+) -> T:
+    """
+    Attend `func()` en reprenant les échecs passagers, avec une attente exponentielle
+    entièrement aléatoire ; `func` renvoie un nouvel awaitable par tentative.
+
+    La dernière exception est levée une fois les `max_retries` reprises épuisées, et
+    les exceptions non reprenables sont levées immédiatement.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except Exception as exc:
+            if attempt >= max_retries or not is_retryable(exc):
+                raise
+            await asyncio.sleep(_backoff_delay(attempt, base_delay, max_delay))
+            attempt += 1
@@ -1,28 +1,94 @@
-from elevenlabs import ElevenLabs, save
+import asyncio
+import logging
 import os
 from models import QuizSection
 from config import Config
+from media_cache import MediaCache, link_or_copy
+from manifest import Manifest
+from media_index import MediaIndex
+from typing import Optional
+from providers import Providers
 
 class VoiceGenerator:
-    def __init__(self, config: Config, OUTPUT_VOICE_DIR: str):
-        self.client = ElevenLabs(api_key=config.ELEVENLABS_API_KEY)
+    def __init__(self, config: Config, OUTPUT_VOICE_DIR: str, manifest: Optional[Manifest] = None,
+                 providers: Optional[Providers] = None, media_index: Optional[MediaIndex] = None):
+        # API calls and their limits, shared by the generators of a run
+        self.providers = providers or Providers(config)
         self.config = config
         self.OUTPUT_VOICE_DIR = OUTPUT_VOICE_DIR
+        self.manifest = manifest
+        # Duration, sample rate and loudness of each voice, measured once for the montage
+        self.media_index = media_index
+        self.cache = MediaCache(
+            os.path.join(config.CACHE_DIR, "tts"),
+            config.TTS_CACHE_MAX_MB * 1024 * 1024,
+            extension=".mp3"
+        )
+        os.makedirs(self.OUTPUT_VOICE_DIR, exist_ok=True)
+
+    def cache_key(self, text: str) -> str:
+        return self.cache.key(text, self.config.ELEVENLABS_VOICE_ID, self.config.ELEVENLABS_MODEL_ID)
 
     def create_voice(self, text: str, filename: str) -> None:
-        if not os.path.exists(self.OUTPUT_VOICE_DIR):
-            os.makedirs(self.OUTPUT_VOICE_DIR)
+        self.providers.run(self.create_voice_async(text, filename))
 
+    async def create_voice_async(self, text: str, filename: str) -> None:
         output_file = os.path.join(self.OUTPUT_VOICE_DIR, filename)
+        key = self.cache_key(text)
 
-        response = self.client.text_to_speech.convert(
-            voice_id=self.config.ELEVENLABS_VOICE_ID,
-            text=text,
-            model_id=self.config.ELEVENLABS_MODEL_ID
-        )
-        save(response, output_file)
+        # Already produced from the same text in this run directory
+        if await self._is_fresh(filename, output_file, key):
+            return
 
-    def generate_all_voices(self, quiz: QuizSection) -> None:
+        # File copies, cache locks and index writes run in threads: the event loop keeps
+        # serving the other requests in flight
+        if not await asyncio.to_thread(self.cache.link_into, key, output_file):
+            await self.providers.text_to_speech(text, output_file)
+            await asyncio.to_thread(self.cache.add, key, output_file)
+        await self._record(filename, output_file, key)
+
+    async def _is_fresh(self, filename: str, output_file: str, key: str) -> bool:
+        if self.manifest is None or not self.manifest.is_fresh("voices", filename, key):
+            return False
+        # A voice edited since it was produced is made again
+        return self.media_index is None or await asyncio.to_thread(
+            self.media_index.verify, "voices", filename, output_file)
+
+    async def _record(self, filename: str, output_file: str, key: str) -> None:
+        if self.media_index is not None:
+            # Decoded off the event loop, while the other voices are downloaded
+            await asyncio.to_thread(self.media_index.record, "voices", filename, output_file)
+        if self.manifest is not None:
+            await asyncio.to_thread(self.manifest.record, "voices", filename, output_file, key)
+
+    def current_files(self, quiz: QuizSection) -> list:
+        """Voices of this run directory already produced from the texts of `quiz`"""
+        if self.manifest is None:
+            return []
+        return [os.path.join(self.OUTPUT_VOICE_DIR, filename) for filename, text in self.voice_parts(quiz).items()
+                if self.manifest.is_fresh("voices", filename, self.cache_key(text))]
+
+    def prune_stale(self, quiz: QuizSection) -> None:
+        """Delete voices of a previous quiz in this run directory that the new one does not use"""
+        if self.manifest is not None:
+            self.manifest.prune("voices", self.voice_parts(quiz))
+        if self.media_index is not None:
+            self.media_index.prune("voices", self.voice_parts(quiz))
+
+    async def _create_shared_voice(self, text: str, filenames: list) -> None:
+        """Generate one text once and give every file reading it the same audio"""
+        await self.create_voice_async(text, filenames[0])
+        first_file = os.path.join(self.OUTPUT_VOICE_DIR, filenames[0])
+        key = self.cache_key(text)
+        for filename in filenames[1:]:
+            output_file = os.path.join(self.OUTPUT_VOICE_DIR, filename)
+            if not await self._is_fresh(filename, output_file, key):
+                await asyncio.to_thread(link_or_copy, first_file, output_file)
+                await self._record(filename, output_file, key)
+
+    @staticmethod
+    def voice_parts(quiz: QuizSection) -> dict:
+        """Map each voice file name to the text it reads"""
         voice_parts = {
             'Introduction.mp3': quiz.introduction,
             'Appel.mp3': quiz.appel_abonnement
@@ -33,6 +99,21 @@ class VoiceGenerator:
             voice_parts[f'Question_{num}.mp3'] = quiz.questions[f'question_{num}']
             voice_parts[f'Reponse_{num}.mp3'] = quiz.reponses[f'reponse_{num}']
 
-        # Generate all voice files
-        for filename, text in voice_parts.items():
-            self.create_voice(text, filename)
+        return voice_parts
+
+    def generate_all_voices(self, quiz: QuizSection) -> None:
+        self.providers.run(self.generate_all_voices_async(quiz))
+
+    async def generate_all_voices_async(self, quiz: QuizSection) -> None:
+        await asyncio.to_thread(self.prune_stale, quiz)
+
+        # Identical texts are requested once
+        texts = {}
+        for filename, text in self.voice_parts(quiz).items():
+            texts.setdefault(text, []).append(filename)
+
+        # Generate all voice files, at most VOICE_WORKERS requests at a time
+        await asyncio.gather(*(self._create_shared_voice(text, filenames) for text, filenames in texts.items()))
+
+        logging.info(f"TTS cache: {self.cache.hits} hits, {self.cache.misses} misses, "
+                     f"{self.cache.size_bytes / 1e6:.1f} MB")